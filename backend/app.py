@@ -1,100 +1,181 @@
-from flask import Flask, request, jsonify
-import joblib
-import tensorflow as tf
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from PIL import Image
 from flask_cors import CORS
-import mysql.connector
+import hashlib
+import io
+import json
 import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
 import pandas as pd
 from dotenv import load_dotenv
+from db import get_pool, read_soil_index_bounds, list_farms, DEFAULT_FARM_ID, STAT_BANDS, STAT_COLUMNS
+from image_store import TRUECOLOR_DIR, image_urls
+from model_registry import ModelRegistry
+from lite_model import LiteModel
+from prediction_cache import PredictionCache, input_key
+from batching import MicroBatcher
+from crop_stats_cache import CropStatsCache
+from dashboard_snapshot import DashboardSnapshots
+from serve import process_memory
+from metrics import Metrics, instrument, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 load_dotenv()  # load .env
 
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",  # set your MySQL password
-    "database": "satellite_data",
-    "port": 3306
-}
-LATEST_IMAGE_PATH = "latest_truecolor.jpg" 
+db = get_pool()  # shared MySQL connection pool (DB_BACKEND=sqlite for local tests)
+stats_cache = CropStatsCache(db, window=5, check_interval=float(os.getenv("STATS_CACHE_CHECK_INTERVAL", 0)))
 
 # -----------------------
 # Recreate the custom class for crop stress
 # -----------------------
+STRESS_RECOMMENDATIONS = {
+    'severe': {
+        'irrigation': 'High: 10-12mm',
+        'fertilizer': 'Nitrogen-rich'
+    },
+    'mild': {
+        'irrigation': 'Medium: 5-7mm',
+        'fertilizer': 'Balanced'
+    }
+}
+DEFAULT_STRESS_RECOMMENDATION = {
+    'irrigation': 'Low: 2-3mm',
+    'fertilizer': 'None'
+}
+
 class CropStressModel:
     def __init__(self, rf_model, label_encoder):
         self.rf = rf_model
         self.le = label_encoder
 
-    def predict_and_recommend(self, X):
-        y_pred = self.rf.predict(X)
-        labels = self.le.inverse_transform(y_pred)
-
-        recs = []
-        for label in labels:
-            if label == 'severe':
-                recs.append({
-                    'irrigation': 'High: 10-12mm',
-                    'fertilizer': 'Nitrogen-rich'
-                })
-            elif label == 'mild':
-                recs.append({
-                    'irrigation': 'Medium: 5-7mm',
-                    'fertilizer': 'Balanced'
-                })
-            else:
-                recs.append({
-                    'irrigation': 'Low: 2-3mm',
-                    'fertilizer': 'None'
-                })
+    def predict_labels(self, X):
+        # One vectorized forest pass for the whole matrix
+        return self.le.inverse_transform(self.rf.predict(X))
 
+    def predict_and_recommend(self, X):
+        labels = self.predict_labels(X)
+        recs = [STRESS_RECOMMENDATIONS.get(label, DEFAULT_STRESS_RECOMMENDATION) for label in labels]
         return labels, recs
 
+# The pickle was written by a training script, so it refers to __main__.CropStressModel;
+# make that resolve when the app is imported (serve.py, gunicorn) rather than run directly
+sys.modules["__main__"].CropStressModel = CropStressModel
+
 # -----------------------
 # Initialize Flask app
 # -----------------------
+class DateJSONProvider(DefaultJSONProvider):
+    """crop_stats.timestamp is a DATE column: send it as YYYY-MM-DD, not an HTTP date."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__)
+app.json = DateJSONProvider(app)
 CORS(app, origins=["http://localhost:5173"])
 
+# Per-route latency/status/in-flight plus per-stage timings, served at /metrics
+metrics = Metrics(snapshot_dir=os.getenv("METRICS_DIR") or None)
+instrument(app, metrics)
+db.observer = lambda seconds: metrics.observe_stage("db", seconds)
+
 # -----------------------
-# Load models
+# Load models (once; hot-reloaded when the file on disk changes)
 # -----------------------
-crop_pipeline: CropStressModel = joblib.load("models/crop_model_pipeline.pkl")
-cnn_model = tf.keras.models.load_model("models/crop_health_model.h5")
-pest_model = tf.keras.models.load_model("models/pest_risk_lstm_model.h5", compile=False)
-soil_model, soil_scaler, soil_imputer = joblib.load("models/soil_health_regressor.pkl")
-soil_fertility_model = joblib.load("models/xgb_model.pkl")
+def load_keras(path, **kwargs):
+    # TensorFlow is imported here so DB-only routes can serve before it is ready
+    import tensorflow as tf
+    configure_tensorflow(tf)
+    return tf.keras.models.load_model(path, **kwargs)
+
+def configure_tensorflow(tf):
+    # TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS size TF's thread pools (0 = one per core);
+    # serve.py splits the cores between workers. Only possible before TF's first op
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(int(os.getenv("TF_INTRA_OP_THREADS", 0)))
+        tf.config.threading.set_inter_op_parallelism_threads(int(os.getenv("TF_INTER_OP_THREADS", 0)))
+    except RuntimeError:
+        pass  # already initialized by an earlier load
+
+def warmup_keras(model):
+    model.predict(np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32), verbose=0)
+
+def warmup_sklearn(model):
+    model.predict(np.zeros((1, model.n_features_in_)))
+
+def warmup_soil_health(artifact):
+    model, scaler, imputer = artifact
+    model.predict(scaler.transform(imputer.transform(np.zeros((1, imputer.n_features_in_)))))
+
+models = ModelRegistry("models", check_interval=float(os.getenv("MODEL_CHECK_INTERVAL", 2.0)))
+models.register("crop_pipeline", "crop_model_pipeline.pkl", warmup=lambda m: warmup_sklearn(m.rf))
+if os.getenv("INFERENCE_RUNTIME", "keras") == "tflite":
+    # Exported by tasks/export_models.py; no TensorFlow graph or Keras predict() overhead per call
+    lite_threads = int(os.getenv("TF_INTRA_OP_THREADS", 0)) or 1
+    models.register("cnn", "crop_health_model.tflite",
+                    loader=lambda path: LiteModel(path, lite_threads), warmup=warmup_keras)
+    models.register("pest", "pest_risk_lstm_model.tflite",
+                    loader=lambda path: LiteModel(path, lite_threads), warmup=warmup_keras)
+else:
+    models.register("cnn", "crop_health_model.h5", loader=load_keras, warmup=warmup_keras, fork_safe=False)
+    models.register("pest", "pest_risk_lstm_model.h5",
+                    loader=lambda path: load_keras(path, compile=False), warmup=warmup_keras, fork_safe=False)
+models.register("soil_health", "soil_health_regressor.pkl", warmup=warmup_soil_health)  # (model, scaler, imputer)
+models.register("soil_fertility", "xgb_model.pkl", warmup=warmup_sklearn)
+models.register("soil_fertility_imputer", "imputer.pkl")
+models.register("soil_fertility_scaler", "scaler.pkl")
+
+# MODEL_LOADING: "parallel" (background, default), "eager" (serial, blocks startup) or "lazy" (first use)
+models.start(mode=os.getenv("MODEL_LOADING", "parallel"), workers=int(os.getenv("MODEL_LOADER_THREADS", 4)))
+
+# Concurrent crop-health uploads share one batched CNN forward pass
+def predict_cnn_batch(batch):
+    with metrics.time("model_inference_seconds", model="cnn"):
+        return models.get("cnn").predict(batch, verbose=0)
+
+cnn_batcher = MicroBatcher(
+    predict_cnn_batch,
+    max_batch_size=int(os.getenv("CNN_MAX_BATCH", 16)),
+    max_wait_ms=float(os.getenv("CNN_MAX_WAIT_MS", 5)),
+    name="cnn-batcher"
+)
 
 fertility_mapping = {0: "Low Fertility", 1: "Medium Fertility", 2: "High Fertility"}
 
+# Stress and soil-fertility are pure functions of their inputs; cached per model version
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 10000))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", 3600))
+stress_cache = PredictionCache("stress", PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+fertility_cache = PredictionCache("soil_fertility", PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+metrics.describe("prediction_cache_lookups_total", "counter", "Prediction cache lookups by cache and result")
+
+def cached_prediction(cache, version, key, compute):
+    value, hit = cache.get_or_compute(version, key, compute)
+    metrics.inc("prediction_cache_lookups_total", cache=cache.name, result="hit" if hit else "miss")
+    return value
+
 # -----------------------
 # Soil health helper functions
 # -----------------------
 def compute_soil_index_bounds():
-    conn = mysql.connector.connect(**DB_CONFIG)
-    c = conn.cursor(dictionary=True)
-    c.execute("SELECT NDVI_mean, NDWI_mean, SWIR_mean, NDSI_mean FROM crop_stats")
-    rows = c.fetchall()
-    conn.close()
-
-    if not rows:
+    # Kept current by save_stats in the ingestion scripts (see db.update_soil_index_bounds)
+    try:
+        return read_soil_index_bounds(db)
+    except Exception:
         return 0, 1  # fallback
 
-    df = pd.DataFrame(rows)
-    # replicate the same soil index formula
-    df["soil_index"] = (
-        0.3 * df["NDVI_mean"]
-        + 0.3 * df["NDWI_mean"]
-        + 0.2 * (1 - df["NDSI_mean"].abs())
-        + 0.2 * df["SWIR_mean"]
-    )
-    return df["soil_index"].min(), df["soil_index"].max()
-
-soil_min, soil_max = compute_soil_index_bounds()
-
-def categorize_soil_health(shi, min_val, max_val):
+def categorize_soil_health(shi, min_val=None, max_val=None):
+    if min_val is None or max_val is None:
+        min_val, max_val = compute_soil_index_bounds()
     norm = (shi - min_val) / (max_val - min_val + 1e-9)  # normalize 0-1
     if norm >= 0.66:
         return "healthy"
@@ -109,15 +190,77 @@ def categorize_soil_health(shi, min_val, max_val):
 @app.route("/predict/stress", methods=["POST"])
 def predict_stress():
     try:
-        data = request.json
-        features = np.array(data["features"]).reshape(1, -1)
+        with metrics.stage("decode"):
+            data = request.json
+        with metrics.stage("preprocess"):
+            features = np.array(data["features"]).reshape(1, -1)
+
+        crop_pipeline: CropStressModel = models.get("crop_pipeline")
 
-        labels, recs = crop_pipeline.predict_and_recommend(features)
+        def predict():
+            with metrics.stage("inference", model="crop_pipeline"):
+                labels, recs = crop_pipeline.predict_and_recommend(features)
+            return {"stress_label": labels[0], "recommendations": recs[0]}
 
-        return jsonify({
-            "stress_label": labels[0],
-            "recommendations": recs[0]
-        })
+        # 1 and 1.0 are the same input
+        key = input_key(np.asarray(features, dtype=np.float64))
+        result = cached_prediction(stress_cache, models.version("crop_pipeline"), key, predict)
+
+        with metrics.stage("serialize"):
+            return jsonify(result)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# -----------------------
+# Endpoint 1b: Batched stress scoring (N x F feature matrix per call)
+# -----------------------
+def parse_feature_matrix(req):
+    """Read an N x F matrix from JSON, NDJSON or a binary .npy body."""
+    content_type = (req.mimetype or "").lower()
+
+    if content_type in ("application/x-npy", "application/octet-stream"):
+        X = np.load(io.BytesIO(req.get_data()), allow_pickle=False)
+    elif content_type in ("application/x-ndjson", "application/jsonl"):
+        rows = []
+        for line in req.get_data(as_text=True).splitlines():
+            if line.strip():
+                row = json.loads(line)
+                rows.append(row["features"] if isinstance(row, dict) else row)
+        X = np.asarray(rows, dtype=np.float64)
+    else:
+        X = np.asarray(req.get_json()["features"], dtype=np.float64)
+
+    if X.size == 0:  # before the reshape, which would turn [] into a 1 x 0 matrix
+        raise ValueError(f"Expected a non-empty N x F feature matrix, got shape {X.shape}")
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.ndim != 2:
+        raise ValueError(f"Expected a non-empty N x F feature matrix, got shape {X.shape}")
+    return X
+
+@app.route("/predict/stress/batch", methods=["POST"])
+def predict_stress_batch():
+    try:
+        with metrics.stage("decode"):
+            X = parse_feature_matrix(request)
+
+        crop_pipeline: CropStressModel = models.get("crop_pipeline")
+        with metrics.stage("inference", model="crop_pipeline"):
+            labels = crop_pipeline.predict_labels(X)
+
+        # Recommendations are sent once per label instead of once per row
+        recommendations = {
+            label: STRESS_RECOMMENDATIONS.get(label, DEFAULT_STRESS_RECOMMENDATION)
+            for label in np.unique(labels).tolist()
+        }
+
+        with metrics.stage("serialize"):
+            return jsonify({
+                "count": int(X.shape[0]),
+                "stress_labels": labels.tolist(),
+                "recommendations": recommendations
+            })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -125,31 +268,58 @@ def predict_stress():
 # -----------------------
 # Endpoint 2: CNN Crop Health (image-based, binary classifier)
 # -----------------------
+CNN_INPUT_SIZE = (128, 128)
+
+def preprocess_image(file):
+    """Decode an upload straight to a float32 RGB array at the CNN input size."""
+    with metrics.stage("decode"):
+        img = Image.open(file)
+        # JPEG only: let libjpeg decode at 1/2-1/8 scale instead of full phone resolution
+        img.draft("RGB", CNN_INPUT_SIZE)
+        img = img.convert("RGB")  # RGBA / grayscale → 3 channels
+    with metrics.stage("preprocess"):
+        img = img.resize(CNN_INPUT_SIZE)
+        return np.asarray(img, dtype=np.float32) * np.float32(1 / 255.0)
+
+def crop_health_result(prediction):
+    if prediction > 0.5:
+        class_name = "unhealthy"
+        confidence = float(prediction)  # confidence for unhealthy
+    else:
+        class_name = "healthy"
+        confidence = float(1 - prediction)  # confidence for healthy
+
+    return {
+        "crop_health_class": class_name,
+        "confidence": confidence
+    }
+
 @app.route("/predict/crop-health", methods=["POST"])
 def predict_crop_health():
     try:
-        if "file" not in request.files:
+        files = request.files.getlist("file") + request.files.getlist("files")
+        if not files:
             return jsonify({"error": "No file uploaded"}), 400
 
-        file = request.files["file"]
-        img = Image.open(file).resize((128, 128))  # match CNN input
-        img_array = np.array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-
-        # Binary classification: model outputs [[p]]
-        prediction = cnn_model.predict(img_array, verbose=0)[0][0]
-
-        if prediction > 0.5:
-            class_name = "unhealthy"
-            confidence = float(prediction)  # confidence for unhealthy
-        else:
-            class_name = "healthy"
-            confidence = float(1 - prediction)  # confidence for healthy
-
-        return jsonify({
-            "crop_health_class": class_name,
-            "confidence": confidence
-        })
+        images = [preprocess_image(f) for f in files]
+
+        # Binary classification: model outputs [p] per image
+        if len(images) == 1:
+            # Single uploads are coalesced with concurrent requests
+            # (the inference stage includes waiting for the batch to fill)
+            with metrics.stage("inference"):
+                prediction = cnn_batcher.submit(images[0], timeout=30)[0]
+            with metrics.stage("serialize"):
+                return jsonify(crop_health_result(prediction))
+
+        # Multi-file uploads are already a batch: one forward pass for all of them
+        with metrics.stage("inference", model="cnn"):
+            predictions = models.get("cnn").predict(np.stack(images), verbose=0)[:, 0]
+        with metrics.stage("serialize"):
+            return jsonify([
+                {"filename": f.filename, **crop_health_result(p)}
+                for f, p in zip(files, predictions)
+            ])
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -157,122 +327,268 @@ def predict_crop_health():
 # -----------------------
 # Endpoint 3: Pest Risk Prediction (LSTM sequence model)
 # -----------------------
+PEST_FEATURES = [
+    "NDVI_mean",
+    "NDWI_mean",
+    "NDSI_mean",
+    "SWIR_mean",
+    "FalseColor_mean",
+    "TCI_mean"
+]
+PEST_WINDOW = 5
+PEST_RISK_LEVELS = ["low", "medium", "high"]
+PEST_RECOMMENDATIONS = {
+    "low": "✅ No immediate action required. Continue routine monitoring.",
+    "medium": "⚠️ Apply preventive measures (early pest detection, eco-friendly pesticides).",
+    "high": "🚨 Immediate action required! Use strong pest control measures and monitor daily."
+}
+PEST_MEMO_SIZE = 100000
+
+# (farm_id, window end timestamp) -> (model version, window digest, result)
+pest_memo = OrderedDict()
+pest_memo_lock = threading.Lock()
+
+def score_pest_windows(farm_id, rows):
+    """Risk for every 5-step window over `rows` (ascending), one result per window end.
+
+    Windows are a strided view over the feature matrix. Results are memoized
+    per window end timestamp, checked against the model version and a digest
+    of the window's values, so only new or changed windows reach the LSTM, in
+    a single batched predict call.
+    """
+    with metrics.stage("preprocess"):
+        X = np.array([[r[f] for f in PEST_FEATURES] for r in rows], dtype=np.float32)
+        if len(X) < PEST_WINDOW:
+            return []
+        windows = sliding_window_view(X, (PEST_WINDOW, X.shape[1]))[:, 0]  # (n, 5, 6), no copy
+
+    model = models.get("pest")
+    version = models.version("pest")
+
+    results, todo = [None] * len(windows), []
+    with pest_memo_lock:
+        for i, window in enumerate(windows):
+            key = (farm_id, str(rows[i + PEST_WINDOW - 1]["timestamp"]))
+            digest = hashlib.blake2b(window.tobytes(), digest_size=8).digest()
+            hit = pest_memo.get(key)
+            if hit and hit[0] == version and hit[1] == digest:
+                results[i] = hit[2]
+                pest_memo.move_to_end(key)
+            else:
+                todo.append((i, key, digest))
+
+    if todo:
+        with metrics.stage("inference", model="pest"):
+            preds = model.predict(windows[[i for i, _, _ in todo]], verbose=0)
+        with pest_memo_lock:
+            for (i, key, digest), p in zip(todo, preds):
+                results[i] = {
+                    "timestamp": key[1],
+                    "risk_level": PEST_RISK_LEVELS[int(np.argmax(p))],
+                    "confidence": round(float(np.max(p)), 3)
+                }
+                pest_memo[key] = (version, digest, results[i])
+            while len(pest_memo) > PEST_MEMO_SIZE:
+                pest_memo.popitem(last=False)
+    return results
+
+def pest_risk_body(farm_id, rows):
+    """Risk of the newest window over `rows` (ascending, at least PEST_WINDOW of them)."""
+    result = score_pest_windows(farm_id, rows)[-1]
+    return {
+        "risk_level": result["risk_level"],
+        "confidence": result["confidence"],
+        "recommendation": PEST_RECOMMENDATIONS[result["risk_level"]]
+    }
+
 @app.route("/predict/pest-risk", methods=["GET"])
 def predict_pest_risk():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        c = conn.cursor(dictionary=True)
+        farm_id = request.args.get("farm_id", default=DEFAULT_FARM_ID, type=int)
 
         # Fetch last 5 records (for sequence input)
-        c.execute("SELECT * FROM crop_stats ORDER BY timestamp DESC LIMIT 5")
-        rows = c.fetchall()
-        conn.close()
+        rows = stats_cache.recent(PEST_WINDOW, farm_id)
 
-        if len(rows) < 5:
+        if len(rows) < PEST_WINDOW:
             return jsonify({"error": "Not enough data for pest risk prediction"}), 400
 
         # Order by ascending timestamp (LSTM needs correct sequence order)
         rows = sorted(rows, key=lambda r: r["timestamp"])
 
-        # Extract 6 features
-        feature_names = [
-            "NDVI_mean",
-            "NDWI_mean",
-            "NDSI_mean",
-            "SWIR_mean",
-            "FalseColor_mean",
-            "TCI_mean"
-        ]
-
-        X_seq = []
-        for r in rows:
-            feats = [r[f] for f in feature_names]
-            X_seq.append(feats)
-
-        # Reshape into (1, timesteps, features)
-        X_seq = np.array(X_seq).reshape(1, 5, 6)
-
-        # Predict
-        preds = pest_model.predict(X_seq, verbose=0)
-        pred_idx = np.argmax(preds, axis=1)[0]
-        confidence = float(np.max(preds))
-
-        # Map to human-readable risk
-        risk_levels = ["low", "medium", "high"]
-        risk_label = risk_levels[pred_idx]
-
-        # Recommendation mapping
-        if risk_label == "low":
-            recommendation = "✅ No immediate action required. Continue routine monitoring."
-        elif risk_label == "medium":
-            recommendation = "⚠️ Apply preventive measures (early pest detection, eco-friendly pesticides)."
-        else:
-            recommendation = "🚨 Immediate action required! Use strong pest control measures and monitor daily."
-
-        return jsonify({
-            "risk_level": risk_label,
-            "confidence": round(confidence, 3),
-            "recommendation": recommendation
-        })
+        result = pest_risk_body(farm_id, rows)
+
+        with metrics.stage("serialize"):
+            return jsonify(result)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route("/predict/pest-risk/history", methods=["GET"])
+def predict_pest_risk_history():
+    """One risk per crop_stats date in ?from=&to=, each scored on the 5 rows ending there."""
+    try:
+        farm_id = request.args.get("farm_id", default=DEFAULT_FARM_ID, type=int)
+        date_from = request.args.get("from", default="0001-01-01")
+        date_to = request.args.get("to", default="9999-12-31")
+        columns = ", ".join(["timestamp"] + PEST_FEATURES)
+
+        rows = db.fetchall(
+            f"SELECT {columns} FROM crop_stats WHERE farm_id = %s AND timestamp >= %s AND timestamp <= %s "
+            "ORDER BY timestamp",
+            (farm_id, date_from, date_to)
+        )
+        # The 4 rows before `from` let the first dates in range get a full window
+        lead = db.fetchall(
+            f"SELECT {columns} FROM crop_stats WHERE farm_id = %s AND timestamp < %s "
+            "ORDER BY timestamp DESC LIMIT %s",
+            (farm_id, date_from, PEST_WINDOW - 1)
+        )
+
+        results = score_pest_windows(farm_id, lead[::-1] + rows)
+        with metrics.stage("serialize"):
+            return jsonify(results)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+SOIL_FEATURES = ["FalseColor_mean", "NDVI_mean", "NDWI_mean", "SWIR_mean", "TCI_mean", "NDSI_mean"]
+SOIL_STREAM_THRESHOLD = int(os.getenv("SOIL_STREAM_THRESHOLD", 1000))
+SOIL_CHUNK_SIZE = 1000
+SOIL_POOR_THRESHOLD = 300  # default soil-health class boundaries; ?poor= and ?moderate= override
+SOIL_MODERATE_THRESHOLD = 700
+
+def score_soil_rows(rows, poor_thresh, moderate_thresh):
+    """Score a list of crop_stats rows in one imputer → scaler → predict pass."""
+    model, scaler, imputer = models.get("soil_health")
+
+    with metrics.stage("preprocess"):
+        X = np.array([[row[f] for f in SOIL_FEATURES] for row in rows], dtype=np.float64)
+        X = scaler.transform(imputer.transform(X))
+    with metrics.stage("inference", model="soil_health"):
+        preds = model.predict(X)
+
+    # ✅ Threshold classification controlled by frontend
+    classes = np.where(preds < poor_thresh, "poor",
+                       np.where(preds <= moderate_thresh, "moderate", "healthy"))
+
+    thresholds = {"poor": poor_thresh, "moderate": moderate_thresh}
+    return [
+        {
+            "timestamp": row["timestamp"],
+            "soil_health_index": round(float(pred_val), 3),
+            "soil_health_class": str(pred_class),
+            "thresholds": thresholds
+        }
+        for row, pred_val, pred_class in zip(rows, preds, classes)
+    ]
+
+def iter_recent_rows(farm_id, limit, chunk_size=SOIL_CHUNK_SIZE):
+    """The farm's latest `limit` rows, oldest → newest, in keyset pages of `chunk_size`.
+
+    Each page is its own short query, so no pooled connection stays checked
+    out while a slow client reads the stream.
+    """
+    if limit < 1:
+        return
+    first = db.fetchone(
+        "SELECT timestamp FROM crop_stats WHERE farm_id = %s ORDER BY timestamp DESC LIMIT 1 OFFSET %s",
+        (farm_id, limit - 1)
+    )
+    op, after = ">=", first["timestamp"] if first else "0001-01-01"  # fewer rows than `limit`: all of them
+    while limit > 0:
+        rows = db.fetchall(
+            f"SELECT * FROM crop_stats WHERE farm_id = %s AND timestamp {op} %s ORDER BY timestamp LIMIT %s",
+            (farm_id, after, min(chunk_size, limit))
+        )
+        if not rows:
+            return
+        yield rows
+        limit -= len(rows)
+        op, after = ">", rows[-1]["timestamp"]
+
+def stream_soil_health(farm_id, limit, poor_thresh, moderate_thresh, ndjson):
+    """Score the latest `limit` rows chunk by chunk so memory stays flat."""
+    chunks = iter_recent_rows(farm_id, limit)
+
+    if ndjson:
+        for rows in chunks:
+            results = score_soil_rows(rows, poor_thresh, moderate_thresh)
+            with metrics.stage("serialize"):
+                yield "".join(json.dumps(r, default=str) + "\n" for r in results)
+        return
+
+    yield "["
+    first = True
+    for rows in chunks:
+        results = score_soil_rows(rows, poor_thresh, moderate_thresh)
+        with metrics.stage("serialize"):
+            body = ",".join(json.dumps(r, default=str) for r in results)
+        yield body if first else "," + body
+        first = False
+    yield "]"
+
 @app.route("/predict/soil-health", methods=["GET"])
 def predict_soil_health():
     try:
         # Optional params
+        farm_id = request.args.get("farm_id", default=DEFAULT_FARM_ID, type=int)
         limit = request.args.get("limit", default=1, type=int)
-        poor_thresh = request.args.get("poor", default=300, type=float)
-        moderate_thresh = request.args.get("moderate", default=700, type=float)
-
-        # Connect DB
-        conn = mysql.connector.connect(**DB_CONFIG)
-        c = conn.cursor(dictionary=True)
-        c.execute(f"SELECT * FROM crop_stats ORDER BY timestamp DESC LIMIT {limit}")
-        rows = c.fetchall()
-        conn.close()
+        poor_thresh = request.args.get("poor", default=SOIL_POOR_THRESHOLD, type=float)
+        moderate_thresh = request.args.get("moderate", default=SOIL_MODERATE_THRESHOLD, type=float)
+        ndjson = request.args.get("format") == "ndjson" or request.accept_mimetypes.best == "application/x-ndjson"
+
+        # Large windows are streamed instead of materialized in memory
+        if ndjson or limit > SOIL_STREAM_THRESHOLD:
+            # Checked up front: once streaming starts the status is already sent
+            if db.fetchone("SELECT 1 AS found FROM crop_stats WHERE farm_id = %s LIMIT 1", (farm_id,)) is None:
+                return jsonify({"error": "No data found"}), 404
+            return Response(
+                metrics.stream(stream_soil_health(farm_id, limit, poor_thresh, moderate_thresh, ndjson)),
+                mimetype="application/x-ndjson" if ndjson else "application/json"
+            )
+
+        rows = db.fetchall(
+            "SELECT * FROM crop_stats WHERE farm_id = %s ORDER BY timestamp DESC LIMIT %s",
+            (farm_id, limit)
+        )
 
         if not rows:
             return jsonify({"error": "No data found"}), 404
 
         rows = sorted(rows, key=lambda r: r["timestamp"])  # oldest → newest
+        results = score_soil_rows(rows, poor_thresh, moderate_thresh)
 
-        # Load model, scaler, imputer
-        model, scaler, imputer = joblib.load("models/soil_health_regressor.pkl")
-        feature_names = ["FalseColor_mean", "NDVI_mean", "NDWI_mean", "SWIR_mean", "TCI_mean", "NDSI_mean"]
-
-        results = []
-        for row in rows:
-            X = np.array([row[f] for f in feature_names]).reshape(1, -1)
-            X = imputer.transform(X)
-            X = scaler.transform(X)
-
-            pred_val = float(model.predict(X)[0])
-
-            # ✅ Threshold classification controlled by frontend
-            if pred_val < poor_thresh:
-                pred_class = "poor"
-            elif poor_thresh <= pred_val <= moderate_thresh:
-                pred_class = "moderate"
-            else:
-                pred_class = "healthy"
-
-            results.append({
-                "timestamp": row["timestamp"],
-                "soil_health_index": round(pred_val, 3),
-                "soil_health_class": pred_class,
-                "thresholds": {
-                    "poor": poor_thresh,
-                    "moderate": moderate_thresh
-                }
-            })
-
-        return jsonify(results[0] if limit == 1 else results)
+        with metrics.stage("serialize"):
+            return jsonify(results[0] if limit == 1 else results)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# -----------------------
+# crop_stats row → nested {"NDVI": {"mean", "median", "std"}, ...}
+# -----------------------
+def row_indices(row):
+    return {
+        band: {"mean": row[f"{band}_mean"], "median": row[f"{band}_median"], "std": row[f"{band}_std"]}
+        for band in STAT_BANDS
+    }
+
+def latest_stats_body(farm_id, row):
+    # Per-timestamp pyramid of this farm; none recorded means no image, not another farm's
+    image = stats_cache.truecolor(farm_id, row["timestamp"])
+    if image:
+        image_sizes = image_urls(*image)
+        image_url = image_sizes.get("512") or list(image_sizes.values())[-1]
+    else:
+        image_sizes = {}
+        image_url = None
+
+    return {
+        "timestamp": row["timestamp"],
+        "indices": row_indices(row),
+        "true_color_image": image_url,
+        "true_color_images": image_sizes
+    }
 
 # -----------------------
 # Endpoint: Latest crop stats
@@ -280,48 +596,43 @@ def predict_soil_health():
 @app.route("/latest-crop-stats", methods=["GET"])
 def latest_crop_stats():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        c = conn.cursor(dictionary=True)
+        farm_id = request.args.get("farm_id", default=DEFAULT_FARM_ID, type=int)
+
         # Fetch the latest row
-        c.execute("SELECT * FROM crop_stats ORDER BY timestamp DESC LIMIT 1")
-        row = c.fetchone()
-        conn.close()
+        row = stats_cache.latest(farm_id)
 
         if not row:
             return jsonify({"error": "No data found"}), 404
 
-        # Ensure frontend can access image
-        image_url = f"/static/{os.path.basename(LATEST_IMAGE_PATH)}"
-
-        return jsonify({
-            "timestamp": row["timestamp"],
-            "indices": {
-                "NDVI": {"mean": row["NDVI_mean"], "median": row["NDVI_median"], "std": row["NDVI_std"]},
-                "NDWI": {"mean": row["NDWI_mean"], "median": row["NDWI_median"], "std": row["NDWI_std"]},
-                "NDSI": {"mean": row["NDSI_mean"], "median": row["NDSI_median"], "std": row["NDSI_std"]},
-                "SWIR": {"mean": row["SWIR_mean"], "median": row["SWIR_median"], "std": row["SWIR_std"]},
-                "FalseColor": {"mean": row["FalseColor_mean"], "median": row["FalseColor_median"], "std": row["FalseColor_std"]},
-                "TCI": {"mean": row["TCI_mean"], "median": row["TCI_median"], "std": row["TCI_std"]}
-            },
-            "true_color_image": image_url
-        })
+        response = jsonify(latest_stats_body(farm_id, row))
+        # Lets polling clients revalidate with If-None-Match and get a 304
+        response.add_etag()
+        return response.make_conditional(request)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# -----------------------
+# Endpoint: True-color images (content-addressed, so cacheable forever)
+# -----------------------
+@app.route("/images/truecolor/<name>", methods=["GET"])
+def truecolor_image(name):
+    response = send_from_directory(
+        TRUECOLOR_DIR, name, max_age=31536000, etag=os.path.splitext(name)[0], conditional=True
+    )
+    response.cache_control.immutable = True
+    return response
+
 # -----------------------
 # Endpoint: Last 5 crop stats (for analytics/graphs)
 # -----------------------
 @app.route("/recent-crop-stats", methods=["GET"])
 def recent_crop_stats():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        c = conn.cursor(dictionary=True)
+        farm_id = request.args.get("farm_id", default=DEFAULT_FARM_ID, type=int)
 
         # Fetch last 5 rows sorted by date (most recent first)
-        c.execute("SELECT * FROM crop_stats ORDER BY timestamp DESC LIMIT 5")
-        rows = c.fetchall()
-        conn.close()
+        rows = stats_cache.recent(5, farm_id)
 
         if not rows:
             return jsonify({"error": "No data found"}), 404
@@ -330,32 +641,165 @@ def recent_crop_stats():
         rows = sorted(rows, key=lambda r: r["timestamp"])
 
         # Build response
-        response = []
-        for row in rows:
-            response.append({
-                "timestamp": row["timestamp"],
-                "indices": {
-                    "NDVI": {"mean": row["NDVI_mean"], "median": row["NDVI_median"], "std": row["NDVI_std"]},
-                    "NDWI": {"mean": row["NDWI_mean"], "median": row["NDWI_median"], "std": row["NDWI_std"]},
-                    "NDSI": {"mean": row["NDSI_mean"], "median": row["NDSI_median"], "std": row["NDSI_std"]},
-                    "SWIR": {"mean": row["SWIR_mean"], "median": row["SWIR_median"], "std": row["SWIR_std"]},
-                    "FalseColor": {"mean": row["FalseColor_mean"], "median": row["FalseColor_median"], "std": row["FalseColor_std"]},
-                    "TCI": {"mean": row["TCI_mean"], "median": row["TCI_median"], "std": row["TCI_std"]}
-                }
-            })
+        response = [{"timestamp": row["timestamp"], "indices": row_indices(row)} for row in rows]
 
         return jsonify(response)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     
+# -----------------------
+# Endpoint: Time-range crop stats with server-side downsampling (for charts)
+# -----------------------
+BUCKET_RULES = {"day": "D", "week": "W-MON", "month": "MS"}
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of `n_out` points that keep the series' shape."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    picked = [0]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)  # n_out - 2 inner buckets
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        nxt_end = edges[i + 2] if i + 2 < len(edges) else n
+        nxt_x, nxt_y = x[end:nxt_end].mean(), y[end:nxt_end].mean()
+        area = np.abs((x[a] - nxt_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (nxt_y - y[a]))
+        a = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        picked.append(a)
+    picked.append(n - 1)
+    return np.array(picked)
+
+def columnar_json(columns):
+    """Stream {"col": [...], ...} one column at a time; NaN becomes null."""
+    yield "{"
+    for i, (name, values) in enumerate(columns.items()):
+        values = [None if v is None or v != v else v for v in values]
+        yield ("," if i else "") + json.dumps(name) + ":" + json.dumps(values, separators=(",", ":"), default=str)
+    yield "}"
+
+@app.route("/crop-stats", methods=["GET"])
+def crop_stats_range():
+    """?from=YYYY-MM-DD&to=YYYY-MM-DD&fields=NDVI_mean,NDWI_mean&bucket=day|week|month|lttb&points=200"""
+    try:
+        farm_id = request.args.get("farm_id", default=DEFAULT_FARM_ID, type=int)
+        date_from = request.args.get("from", default="0001-01-01")
+        date_to = request.args.get("to", default="9999-12-31")
+        fields = request.args.get("fields", default="NDVI_mean").split(",")
+        bucket = request.args.get("bucket")
+        points = request.args.get("points", default=500, type=int)
+
+        unknown = [f for f in fields if f not in STAT_COLUMNS]  # also keeps the SELECT list safe
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+        if bucket and bucket != "lttb" and bucket not in BUCKET_RULES:
+            return jsonify({"error": "bucket must be one of day, week, month, lttb"}), 400
+
+        # Range scan on the (farm_id, timestamp) primary key, only the requested columns
+        rows = db.fetchall(
+            f"SELECT timestamp, {', '.join(fields)} FROM crop_stats "
+            "WHERE farm_id = %s AND timestamp >= %s AND timestamp <= %s ORDER BY timestamp",
+            (farm_id, date_from, date_to)
+        )
+        with metrics.stage("preprocess"):
+            df = pd.DataFrame(rows, columns=["timestamp"] + fields)
+            df[fields] = df[fields].astype(float)
+
+            if bucket in BUCKET_RULES and not df.empty:
+                df.index = pd.to_datetime(df.pop("timestamp"))
+                df = df.resample(BUCKET_RULES[bucket], label="left", closed="left").mean().dropna(how="all")
+                df.insert(0, "timestamp", df.index.strftime("%Y-%m-%d"))
+            elif bucket == "lttb" and len(df) > points:
+                x = pd.to_datetime(df["timestamp"]).to_numpy().astype("int64").astype(float)
+                df = df.iloc[lttb_indices(x, df[fields[0]].to_numpy(), points)]
+
+            columns = {"timestamp": df["timestamp"].tolist()}
+            for f in fields:
+                columns[f] = df[f].round(5).tolist()
+        return Response(metrics.stream(columnar_json(columns), stage="serialize"), mimetype="application/json")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+# -----------------------
+# Endpoint: Dashboard (latest indices, trend, pest risk, soil health in one snapshot)
+# -----------------------
+def dashboard_part(name, model_names, build, errors):
+    """One model-backed dashboard section, or None with a reason in `errors`.
+
+    A section whose model is still loading is left out rather than waited
+    for, so the DB-backed parts serve before TensorFlow is ready.
+    """
+    loading = [m for m in model_names if models.state(m) == "loading"]
+    if loading:
+        errors[name] = f"Model '{loading[0]}' is still loading"
+        return None
+    try:
+        return build()
+    except Exception as e:
+        errors[name] = str(e)
+        return None
+
+def build_dashboard(farm_id):
+    """Serialized body of /dashboard; each part matches the response of its standalone endpoint."""
+    rows = sorted(stats_cache.recent(PEST_WINDOW, farm_id), key=lambda r: r["timestamp"])  # oldest → newest
+    if not rows:
+        return None
+
+    errors = {}
+    if len(rows) >= PEST_WINDOW:
+        pest = dashboard_part("pest_risk", ["pest"], lambda: pest_risk_body(farm_id, rows), errors)
+    else:
+        pest, errors["pest_risk"] = None, "Not enough data for pest risk prediction"
+    soil = dashboard_part(
+        "soil_health", ["soil_health"],
+        lambda: score_soil_rows(rows[-1:], SOIL_POOR_THRESHOLD, SOIL_MODERATE_THRESHOLD)[0], errors
+    )
+    body = {
+        "farm_id": farm_id,
+        "latest": latest_stats_body(farm_id, rows[-1]),
+        "recent": [{"timestamp": row["timestamp"], "indices": row_indices(row)} for row in rows],
+        "pest_risk": pest,
+        "soil_health": soil,
+        "errors": errors
+    }
+    with metrics.stage("serialize"):
+        return app.json.dumps(body).encode()
+
+# Model states are part of the key: a section left out while loading is filled in once it's ready
+dashboards = DashboardSnapshots(
+    db, build_dashboard,
+    version=lambda: tuple((models.version(m), models.state(m)) for m in ("pest", "soil_health")),
+    check_interval=float(os.getenv("STATS_CACHE_CHECK_INTERVAL", 0))
+)
+
+@app.route("/dashboard", methods=["GET"])
+def dashboard():
+    try:
+        farm_id = request.args.get("farm_id", default=DEFAULT_FARM_ID, type=int)
+
+        body, etag = dashboards.get(farm_id)
+        if body is None:
+            return jsonify({"error": "No data found"}), 404
+
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 # -----------------------
 # Endpoint: Soil Fertility (XGBoost with imputer + scaler)
 # -----------------------
 @app.route("/predict/soil-fertility", methods=["POST"])
 def predict_soil_fertility():
     try:
-        data = request.json
+        with metrics.stage("decode"):
+            data = request.json
 
         # Required features (same order as training)
         expected_features = ['N','P','K','pH','EC','OC','S','Zn','Fe','Cu','Mn','B']
@@ -365,33 +809,116 @@ def predict_soil_fertility():
             if f not in data:
                 return jsonify({"error": f"Missing feature: {f}"}), 400
 
-        # Convert into DataFrame
-        sample_df = pd.DataFrame([data], columns=expected_features)
+        xgb_model = models.get("soil_fertility")
+        imputer = models.get("soil_fertility_imputer")
+        scaler = models.get("soil_fertility_scaler")
 
-        # Load pre-saved XGBoost model, imputer, and scaler
-        xgb_model = joblib.load("models/xgb_model.pkl")
-        imputer = joblib.load("models/imputer.pkl")
-        scaler = joblib.load("models/scaler.pkl")
+        def predict():
+            with metrics.stage("preprocess"):
+                # Convert into DataFrame
+                sample_df = pd.DataFrame([data], columns=expected_features)
 
-        # Preprocess the input
-        X_imputed = imputer.transform(sample_df)
-        X_scaled = scaler.transform(X_imputed)
+                # Preprocess the input
+                X_imputed = imputer.transform(sample_df)
+                X_scaled = scaler.transform(X_imputed)
 
-        # Predict
-        pred = xgb_model.predict(X_scaled)[0]
-        fertility_label = fertility_mapping.get(int(pred), "Unknown")
+            # Predict
+            with metrics.stage("inference", model="soil_fertility"):
+                pred = xgb_model.predict(X_scaled)[0]
+            return {"prediction": int(pred), "fertility_label": fertility_mapping.get(int(pred), "Unknown")}
 
-        return jsonify({
-            "prediction": int(pred),
-            "fertility_label": fertility_label
-        })
+        # Only the model features, in training order, with numbers normalized (7 == 7.0)
+        values = [float(data[f]) if isinstance(data[f], (int, float)) and not isinstance(data[f], bool) else data[f]
+                  for f in expected_features]
+        key = input_key(json.dumps(values, default=str))
+        version = "|".join(models.version(name) for name in
+                           ("soil_fertility", "soil_fertility_imputer", "soil_fertility_scaler"))
+        result = cached_prediction(fertility_cache, version, key, predict)
+
+        with metrics.stage("serialize"):
+            return jsonify(result)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
 # -----------------------
-# Run app
+# Endpoint: Registered farms (pass farm_id to the crop_stats endpoints)
+# -----------------------
+@app.route("/farms", methods=["GET"])
+def farms():
+    try:
+        return jsonify(list_farms(db))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# -----------------------
+# Endpoint: Connection pool usage
+# -----------------------
+@app.route("/db-stats", methods=["GET"])
+def db_stats():
+    return jsonify({"pool": db.stats(), "crop_stats_cache": stats_cache.stats()})
+
+
+# -----------------------
+# Endpoint: Prediction cache hit rates
+# -----------------------
+@app.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    return jsonify({
+        "stress": stress_cache.stats(),
+        "soil_fertility": fertility_cache.stats(),
+        "dashboard": dashboards.stats()
+    })
+
+
+# -----------------------
+# Endpoint: CNN micro-batcher queue depth / batch sizes
+# -----------------------
+@app.route("/batcher-stats", methods=["GET"])
+def batcher_stats():
+    return jsonify({"crop_health": cnn_batcher.stats()})
+
+
+# -----------------------
+# Endpoint: Readiness (200 once every model is loaded and warmed up)
+# -----------------------
+@app.route("/ready", methods=["GET"])
+def ready():
+    body = {"ready": models.is_ready(), "models": models.versions()}
+    return jsonify(body), 200 if body["ready"] else 503
+
+
+# -----------------------
+# Endpoint: Live model versions
+# -----------------------
+@app.route("/models", methods=["GET"])
+def model_versions():
+    return jsonify(models.versions())
+
+
+# -----------------------
+# Endpoint: Prometheus metrics (all workers when served by serve.py)
+# -----------------------
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+# -----------------------
+# Endpoint: Memory of the process that served this request (see serve.py)
+# -----------------------
+@app.route("/worker-stats", methods=["GET"])
+def worker_stats():
+    try:
+        return jsonify(process_memory())
+    except OSError as e:
+        return jsonify({"pid": os.getpid(), "error": str(e)}), 501
+
+
+# -----------------------
+# Run app (development server; production: python serve.py)
 # -----------------------
 if __name__ == "__main__":
     port = int(os.getenv("FLASK_PORT", 5000))  # fallback 5000 if not set
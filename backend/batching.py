@@ -0,0 +1,99 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+
+# -----------------------
+# Micro-batching request coalescer
+# -----------------------
+class MicroBatcher:
+    """Coalesces single-sample requests into one batched forward pass.
+
+    Callers `submit` one input and block on its result. A background worker
+    waits for the first queued item, keeps collecting until `max_batch_size`
+    items are queued or `max_wait_ms` has passed, runs `predict_fn` on the
+    stacked batch and hands row i of the output back to caller i.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, name="batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+
+    def _ensure_worker(self):
+        # Started lazily so the thread lives in the process that serves requests
+        if self._worker is None or not self._worker.is_alive():
+            with self._start_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._worker.start()
+
+    def submit(self, x, timeout=None):
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((x, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # A malformed input only fails the requests that share its shape
+            groups = {}
+            for x, future in batch:
+                groups.setdefault(np.shape(x), []).append((x, future))
+
+            for group in groups.values():
+                futures = [f for _, f in group]
+                try:
+                    outputs = self.predict_fn(np.stack([x for x, _ in group]))
+                    for future, out in zip(futures, outputs):
+                        future.set_result(out)
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            batches, items = self._batches, self._items
+            sizes = dict(sorted(self._batch_sizes.items()))
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": round(items / batches, 3) if batches else 0.0,
+            "batch_size_counts": sizes
+        }
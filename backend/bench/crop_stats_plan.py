@@ -0,0 +1,126 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db import ConnectionPool, db_config, mysql_connect, sqlite_connect, STAT_COLUMNS, CROP_STATS_COLUMNS
+from migrations import migrate
+
+# -----------------------
+# Query plans: crop_stats before and after migration 2 (VARCHAR -> DATE)
+#
+# Fills a scratch database with the same synthetic rows twice: once in
+# crop_stats as of migration 1 (renamed crop_stats_legacy: the same
+# (farm_id, VARCHAR timestamp) key) and once in crop_stats as built by all
+# of migrations.py. Then prints the plan and median latency of the queries
+# the API and backfill actually run, so the difference is migration 2's alone:
+#   MySQL   3-byte DATE keys instead of VARCHAR(20), plus the crop_stats_timestamp index
+#   SQLite  DATE is only a type affinity and the values stay TEXT, so only the
+#           crop_stats_timestamp index differs (it serves the all-farms range query)
+#
+#   python crop_stats_plan.py [farms=200] [days=1095] [repeat=20] [mysql=<scratch database>]
+#
+# SQLite runs in a temporary file; with mysql= the named database is used and
+# its crop_stats / crop_stats_legacy tables are dropped first.
+# -----------------------
+QUERIES = {
+    "range (/crop-stats)": (
+        "SELECT timestamp, NDVI_mean FROM {table} WHERE farm_id = %s AND timestamp >= %s AND timestamp <= %s "
+        "ORDER BY timestamp",
+        lambda farm, start, end: (farm, start, end)
+    ),
+    "latest 5 (/recent-crop-stats)": (
+        "SELECT * FROM {table} WHERE farm_id = %s ORDER BY timestamp DESC LIMIT 5",
+        lambda farm, start, end: (farm,)
+    ),
+    "all farms, date range (backfill)": (
+        "SELECT farm_id, timestamp FROM {table} WHERE timestamp >= %s AND timestamp < %s",
+        lambda farm, start, end: (start, end)
+    ),
+}
+
+
+def scratch_pool(mysql_database=None):
+    if mysql_database:
+        config = dict(db_config(), database=mysql_database)
+        return ConnectionPool(lambda: mysql_connect(config), 1, 5.0, 30.0, dialect="mysql")
+    path = os.path.join(tempfile.mkdtemp(), "crop_stats_plan.sqlite")
+    return ConnectionPool(lambda: sqlite_connect(path), 1, 5.0, 30.0, dialect="sqlite")
+
+
+def create_tables(db):
+    for table in ("crop_stats", "crop_stats_legacy", "truecolor_images", "schema_migrations"):
+        db.execute(f"DROP TABLE IF EXISTS {table}")
+    # The schema migration 2 starts from, set aside; then a fully migrated crop_stats
+    migrate(db, target=1)
+    db.execute("ALTER TABLE crop_stats RENAME TO crop_stats_legacy")
+    db.execute("DELETE FROM schema_migrations")
+    migrate(db)
+
+
+def fill(db, farms, days, start=date(2020, 1, 1), chunk=5000):
+    # One acquisition date for every farm at a time, the order ingestion writes in
+    rng = random.Random(0)
+    columns = ", ".join(CROP_STATS_COLUMNS)
+    placeholders = ",".join(["%s"] * len(CROP_STATS_COLUMNS))
+    batch = []
+    for d in range(days):
+        ts = (start + timedelta(days=d)).isoformat()
+        for farm in range(1, farms + 1):
+            batch.append((farm, ts) + tuple(rng.random() for _ in STAT_COLUMNS))
+        if len(batch) >= chunk or d == days - 1:
+            for table in ("crop_stats", "crop_stats_legacy"):
+                db.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", batch)
+            batch = []
+    db.execute("ANALYZE" if db.dialect == "sqlite" else "ANALYZE TABLE crop_stats, crop_stats_legacy")
+
+
+def explain(db, sql, params):
+    if db.dialect == "sqlite":
+        return [r["detail"] for r in db.fetchall("EXPLAIN QUERY PLAN " + sql, params)]
+    return [f"type={r['type']} key={r['key']} rows={r['rows']} extra={r['Extra']}"
+            for r in db.fetchall("EXPLAIN " + sql, params)]
+
+
+def time_query(db, sql, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.fetchall(sql, params)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main(farms=200, days=1095, repeat=20, mysql=None):
+    db = scratch_pool(mysql)
+    create_tables(db)
+    started = time.perf_counter()
+    fill(db, farms, days)
+    print(f"{db.dialect}: {farms * days} rows per table in {time.perf_counter() - started:.1f}s\n")
+
+    farm = farms // 2
+    start, end = date(2021, 3, 1).isoformat(), date(2021, 6, 1).isoformat()
+    for label, (template, params) in QUERIES.items():
+        print(f"== {label}")
+        for table in ("crop_stats_legacy", "crop_stats"):
+            sql = template.format(table=table)
+            args = params(farm, start, end)
+            print(f"  {table}: {time_query(db, sql, args, repeat):.2f} ms median")
+            for line in explain(db, sql, args):
+                print(f"    {line}")
+        print()
+    db.close()
+
+
+if __name__ == "__main__":
+    args = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    main(
+        farms=int(args.get("farms", 200)),
+        days=int(args.get("days", 1095)),
+        repeat=int(args.get("repeat", 20)),
+        mysql=args.get("mysql")
+    )
@@ -0,0 +1,315 @@
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(BACKEND_DIR)
+
+# -----------------------
+# Load test for the API routes
+#
+#   python load_test.py [concurrency=8] [duration=10] [routes=stress,pest-risk,...]
+#                       [farms=20] [days=730] [url=http://host:5000] [out=results.json]
+#                       [compare=previous.json] [threshold=0.2]
+#
+# Without url= the app is served in-process by a threaded Werkzeug server,
+# with synthetic stand-ins for every model artifact and a temporary SQLite
+# database seeded with `farms` x `days` of crop_stats history, so no MySQL,
+# TensorFlow or trained models are needed. With url= an already running
+# server (e.g. serve.py) is driven as is.
+#
+# Every route is hammered for `duration` seconds by `concurrency` threads,
+# one keep-alive session each. p50/p95/p99 latency and requests per second
+# are printed and written to `out` as JSON; with compare= the run is checked
+# against an earlier one and routes whose p95 or throughput got worse by more
+# than `threshold` are flagged.
+# -----------------------
+RNG = np.random.default_rng(0)
+
+
+# -----------------------
+# Synthetic model stand-ins (same call signatures as the real artifacts)
+# -----------------------
+class StandInClassifier:
+    def __init__(self, n_features, n_classes):
+        self.n_features_in_ = n_features
+        self.weights = RNG.normal(size=(n_features, n_classes))
+
+    def predict(self, X):
+        return np.argmax(np.asarray(X, dtype=np.float64) @ self.weights, axis=1)
+
+
+class StandInRegressor:
+    def __init__(self, n_features):
+        self.n_features_in_ = n_features
+        self.weights = RNG.uniform(0, 200, size=n_features)
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.weights
+
+
+class StandInTransform:
+    def __init__(self, n_features):
+        self.n_features_in_ = n_features
+
+    def transform(self, X):
+        return np.nan_to_num(np.asarray(X, dtype=np.float64))
+
+
+class StandInLabelEncoder:
+    classes_ = np.array(["healthy", "mild", "severe"])
+
+    def inverse_transform(self, y):
+        return self.classes_[y]
+
+
+class StandInKeras:
+    """A dense layer over the flattened input, softmax (or sigmoid for one output)."""
+
+    def __init__(self, input_shape, n_outputs):
+        self.input_shape = (None,) + input_shape
+        self.weights = RNG.normal(scale=0.01, size=(int(np.prod(input_shape)), n_outputs)).astype(np.float32)
+
+    def predict(self, batch, verbose=0):
+        logits = np.asarray(batch, dtype=np.float32).reshape(len(batch), -1) @ self.weights
+        if logits.shape[1] == 1:
+            return 1 / (1 + np.exp(-logits))
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+def stand_ins(app_module):
+    return {
+        "crop_pipeline": app_module.CropStressModel(StandInClassifier(6, 3), StandInLabelEncoder()),
+        "cnn": StandInKeras(app_module.CNN_INPUT_SIZE + (3,), 1),
+        "pest": StandInKeras((app_module.PEST_WINDOW, len(app_module.PEST_FEATURES)), 3),
+        "soil_health": (StandInRegressor(6), StandInTransform(6), StandInTransform(6)),
+        "soil_fertility": StandInClassifier(12, 3),
+        "soil_fertility_imputer": StandInTransform(12),
+        "soil_fertility_scaler": StandInTransform(12),
+    }
+
+
+# -----------------------
+# In-process server on a seeded SQLite database
+# -----------------------
+def seed_crop_stats(db, farms, days, start=date(2023, 1, 1)):
+    from db import STAT_BANDS, add_farm, upsert_crop_stats
+    from migrations import init_schema
+
+    init_schema(db, [[[0.0, 0.0], [0.0, 0.01], [0.01, 0.01], [0.0, 0.0]]])
+    for i in range(2, farms + 1):
+        add_farm(db, f"farm {i}", [[[0.0, 0.0], [0.0, 0.01], [0.01, 0.01], [0.0, 0.0]]])
+
+    for d in range(days):
+        ts = (start + timedelta(days=d)).isoformat()
+        rows = []
+        for farm_id in range(1, farms + 1):
+            stats = {}
+            for band in STAT_BANDS:
+                mean = float(RNG.uniform(0, 3000) if band == "SWIR" else RNG.uniform(-0.2, 0.9))
+                stats.update({f"{band}_mean": mean, f"{band}_median": mean, f"{band}_stdDev": abs(mean) * 0.1})
+            rows.append((farm_id, ts, stats))
+        upsert_crop_stats(db, rows)
+
+
+def start_local_server(farms, days):
+    from werkzeug.serving import make_server
+
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    os.environ.update({
+        "DB_BACKEND": "sqlite",
+        "DB_SQLITE_PATH": os.path.join(workdir, "satellite_data.sqlite"),
+        "DB_POOL_SIZE": os.getenv("DB_POOL_SIZE", "16"),
+        "MODEL_LOADING": "lazy",
+    })
+    os.environ.pop("METRICS_DIR", None)
+
+    # The registry stats its files, so the stand-ins get empty placeholders under ./models
+    os.makedirs(os.path.join(workdir, "models"))
+    os.chdir(workdir)
+    import app as app_module
+
+    for name, model in stand_ins(app_module).items():
+        filename = os.path.basename(app_module.models.versions()[name]["path"])
+        open(os.path.join("models", filename), "wb").close()
+        app_module.models.register(name, filename, loader=lambda path, model=model: model)
+    app_module.models.start(mode="eager")
+
+    started = time.perf_counter()
+    seed_crop_stats(app_module.db, farms, days)
+    print(f"Seeded {farms} farms x {days} days of crop_stats in {time.perf_counter() - started:.1f}s")
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log line per request
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+# -----------------------
+# Requests per route
+# -----------------------
+def jpeg_upload(size=(1280, 960)):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.fromarray(RNG.integers(0, 255, size=size[::-1] + (3,), dtype=np.uint8)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def route_requests(farms):
+    image = jpeg_upload()
+    farm = lambda i: 1 + i % farms
+    features = RNG.uniform(-1, 1, size=(256, 6)).round(4).tolist()  # drawn up front: RNG isn't thread-safe
+    fertility = dict(zip(["N", "P", "K", "pH", "EC", "OC", "S", "Zn", "Fe", "Cu", "Mn", "B"],
+                         RNG.uniform(0, 10, size=12).round(2).tolist()))
+    return {
+        "stress": lambda s, base, i: s.post(f"{base}/predict/stress",
+                                            json={"features": features[i % 256]}),
+        "crop-health": lambda s, base, i: s.post(f"{base}/predict/crop-health",
+                                                 files={"file": ("field.jpg", image, "image/jpeg")}),
+        "pest-risk": lambda s, base, i: s.get(f"{base}/predict/pest-risk", params={"farm_id": farm(i)}),
+        "soil-health": lambda s, base, i: s.get(f"{base}/predict/soil-health",
+                                                params={"farm_id": farm(i), "limit": 30}),
+        "soil-fertility": lambda s, base, i: s.post(f"{base}/predict/soil-fertility", json=fertility),
+        "latest-crop-stats": lambda s, base, i: s.get(f"{base}/latest-crop-stats", params={"farm_id": farm(i)}),
+        "recent-crop-stats": lambda s, base, i: s.get(f"{base}/recent-crop-stats", params={"farm_id": farm(i)}),
+        "dashboard": lambda s, base, i: s.get(f"{base}/dashboard", params={"farm_id": farm(i)}),
+        "crop-stats": lambda s, base, i: s.get(f"{base}/crop-stats",
+                                               params={"farm_id": farm(i), "fields": "NDVI_mean,NDWI_mean",
+                                                       "bucket": "week"}),
+    }
+
+
+def run_route(base, send, concurrency, duration):
+    deadline = time.perf_counter() + duration
+
+    def worker(n):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            i = n
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    ok = send(session, base, i).status_code < 400
+                except requests.RequestException:
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                errors += not ok
+                i += concurrency
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([x for lat, _ in results for x in lat]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        "requests": int(len(latencies)),
+        "errors": int(sum(e for _, e in results)),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies.max()), 2) if len(latencies) else 0.0
+    }
+
+
+# -----------------------
+# Reporting
+# -----------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, threshold):
+    """Routes whose p95 rose, or whose throughput fell, by more than `threshold` (a fraction)."""
+    regressions = []
+    for route, now in results.items():
+        before = previous.get(route)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            regressions.append(f"{route}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        if before["rps"] and now["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{route}: {before['rps']} -> {now['rps']} req/s")
+    return regressions
+
+
+def main(concurrency=8, duration=10.0, routes=None, farms=20, days=730, url=None, out=None,
+         compare_to=None, threshold=0.2):
+    out = os.path.abspath(out or f"load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+    previous = None
+    if compare_to:
+        with open(compare_to) as f:
+            previous = json.load(f)["routes"]
+
+    server = None
+    if url is None:
+        url, server = start_local_server(farms, days)
+
+    senders = route_requests(farms)
+    selected = routes or list(senders)
+    results = {}
+    print(f"{'route':20}{'reqs':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route in selected:
+        senders[route](requests, url, 0)  # first request outside the clock (lazy imports, caches)
+        r = results[route] = run_route(url, senders[route], concurrency, duration)
+        print(f"{route:20}{r['requests']:>8}{r['errors']:>8}{r['rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+
+    if server is not None:
+        server.shutdown()
+
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "target": "in-process stand-ins" if server is not None else url,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "farms": farms,
+        "days": days,
+        "routes": results
+    }
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {out}")
+
+    if previous is not None:
+        regressions = compare(results, previous, threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    main(
+        concurrency=int(args.get("concurrency", 8)),
+        duration=float(args.get("duration", 10)),
+        routes=args["routes"].split(",") if "routes" in args else None,
+        farms=int(args.get("farms", 20)),
+        days=int(args.get("days", 730)),
+        url=args.get("url"),
+        out=args.get("out"),
+        compare_to=args.get("compare"),
+        threshold=float(args.get("threshold", 0.2))
+    )
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from db import current_generation, find_truecolor, DEFAULT_FARM_ID
+
+
+# -----------------------
+# Read-through cache of the newest crop_stats rows
+# -----------------------
+class CropStatsCache:
+    """Keeps the newest `window` crop_stats rows of each farm in memory.
+
+    Every read does a primary-key lookup of the ingestion generation (bumped
+    by save_stats in the gee scripts) and only re-runs the full query when it
+    has moved, so dashboards see a new Sentinel-2 row on the next poll.
+    If the generation table is missing the cache falls back to querying
+    crop_stats directly.
+
+    The true-color image recorded for a cached row is kept alongside it:
+    ingestion records images before bumping the generation, so the lookup
+    is as fresh as the row.
+    """
+
+    def __init__(self, db, window=5, check_interval=0.0):
+        self.db = db
+        self.window = window
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._windows = {}  # farm_id -> newest-first rows
+        self._images = {}  # (farm_id, timestamp) -> find_truecolor result
+        self._generation = None
+        self._checked_at = 0.0
+        self._hits = 0
+        self._misses = 0
+
+    def _query(self, farm_id, n):
+        return self.db.fetchall(
+            "SELECT * FROM crop_stats WHERE farm_id = %s ORDER BY timestamp DESC LIMIT %s",
+            (farm_id, n)
+        )
+
+    def recent(self, n=None, farm_id=DEFAULT_FARM_ID):
+        """Newest-first list of the farm's latest `n` rows (at most `window`)."""
+        n = n or self.window
+        if n > self.window:
+            return self._query(farm_id, n)
+
+        now = time.monotonic()
+        rows = self._windows.get(farm_id)
+        if rows is not None and now - self._checked_at < self.check_interval:
+            self._hits += 1
+            return rows[:n]
+
+        try:
+            generation = current_generation(self.db)
+        except Exception:
+            return self._query(farm_id, n)  # ingestion hasn't created ingest_state yet
+
+        with self._lock:
+            self._checked_at = now
+            if generation != self._generation:
+                self._windows = {}  # any ingest may have touched any farm
+                self._images = {}
+                self._generation = generation
+            rows = self._windows.get(farm_id)
+            if rows is None:
+                rows = self._windows[farm_id] = self._query(farm_id, self.window)
+                self._misses += 1
+            else:
+                self._hits += 1
+            return rows[:n]
+
+    def latest(self, farm_id=DEFAULT_FARM_ID):
+        rows = self.recent(1, farm_id)
+        return rows[0] if rows else None
+
+    def truecolor(self, farm_id, timestamp):
+        """find_truecolor for a row returned by recent(), cached for the same generation."""
+        key = (farm_id, str(timestamp))
+        with self._lock:
+            if key in self._images:
+                return self._images[key]
+            generation = self._generation
+        image = find_truecolor(self.db, farm_id, timestamp)
+        with self._lock:
+            if generation is not None and generation == self._generation:  # not cleared meanwhile
+                self._images[key] = image
+        return image
+
+    def stats(self):
+        total = self._hits + self._misses
+        return {
+            "generation": self._generation,
+            "window": self.window,
+            "farms_cached": len(self._windows),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0
+        }
@@ -0,0 +1,96 @@
+import hashlib
+import threading
+import time
+
+from db import current_generation
+
+
+# -----------------------
+# Per-farm dashboard snapshots, rebuilt once per ingest
+# -----------------------
+class DashboardSnapshots:
+    """Keeps each farm's serialized dashboard body until the data or a model changes.
+
+    `build(farm_id)` returns the JSON bytes (or None when the farm has no
+    data) and runs at most once per (ingestion generation, `version()`)
+    per farm: concurrent polls after an ingest wait for the one rebuild
+    instead of each re-running the queries and inference. Between ingests
+    a poll is a dict lookup plus the generation check, which
+    `check_interval` can skip as in CropStatsCache.
+    """
+
+    def __init__(self, db, build, version=lambda: None, check_interval=0.0):
+        self.db = db
+        self.build = build
+        self.version = version
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._snapshots = {}  # farm_id -> (body, etag)
+        self._building = {}  # farm_id -> lock held by the thread rebuilding it
+        self._key = None
+        self._checked_at = 0.0
+        self._hits = 0
+        self._builds = 0
+        self._build_seconds = 0.0
+
+    def _current_key(self):
+        try:
+            generation = current_generation(self.db)
+        except Exception:
+            generation = None  # ingestion hasn't created ingest_state yet
+        return (generation, self.version())
+
+    def get(self, farm_id):
+        """Returns (body, etag) for the farm's current snapshot, or (None, None) without data."""
+        now = time.monotonic()
+        with self._lock:
+            snapshot = self._snapshots.get(farm_id)
+            if snapshot is not None and now - self._checked_at < self.check_interval:
+                self._hits += 1
+                return snapshot
+
+        key = self._current_key()
+        with self._lock:
+            self._checked_at = now
+            if key != self._key or key[0] is None:
+                self._snapshots = {}  # any ingest may have touched any farm
+                self._key = key
+            snapshot = self._snapshots.get(farm_id)
+            if snapshot is not None:
+                self._hits += 1
+                return snapshot
+            building = self._building.setdefault(farm_id, threading.Lock())
+
+        with building:
+            with self._lock:
+                snapshot = self._snapshots.get(farm_id)
+                if snapshot is not None and self._key == key:
+                    self._hits += 1
+                    return snapshot
+
+            started = time.perf_counter()
+            body = self.build(farm_id)
+            etag = hashlib.blake2b(body, digest_size=16).hexdigest() if body is not None else None
+            snapshot = (body, etag)
+
+            with self._lock:
+                self._builds += 1
+                self._build_seconds += time.perf_counter() - started
+                # Farms without data aren't kept, so unknown farm_ids can't grow the dicts
+                if body is None:
+                    self._building.pop(farm_id, None)
+                elif self._key == key:  # not superseded by an ingest while building
+                    self._snapshots[farm_id] = snapshot
+            return snapshot
+
+    def stats(self):
+        lookups = self._hits + self._builds
+        return {
+            "generation": self._key[0] if self._key else None,
+            "farms_cached": len(self._snapshots),
+            "hits": self._hits,
+            "builds": self._builds,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            "mean_build_ms": round(1000 * self._build_seconds / self._builds, 2) if self._builds else 0.0
+        }
@@ -0,0 +1,521 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# -----------------------
+# Connection settings (overridable via .env)
+# -----------------------
+def db_config():
+    # Read at pool creation so values from load_dotenv() are picked up
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "root"),
+        "password": os.getenv("DB_PASSWORD", ""),  # set your MySQL password
+        "database": os.getenv("DB_NAME", "satellite_data"),
+        "port": int(os.getenv("DB_PORT", 3306))
+    }
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+def mysql_connect(config):
+    import mysql.connector  # only needed when actually talking to MySQL
+    return mysql.connector.connect(**config)
+
+
+def sqlite_connect(path):
+    conn = sqlite3.connect(path, uri=path.startswith("file:"), check_same_thread=False)
+    conn.row_factory = _dict_row
+    return conn
+
+
+# -----------------------
+# Bounded connection pool
+# -----------------------
+class ConnectionPool:
+    """Thread-safe pool of at most `size` connections shared by every route.
+
+    Connections are created lazily, health-checked when they have been idle
+    longer than `ping_after` seconds, and checkouts block for at most
+    `timeout` seconds before raising PoolTimeout.
+    """
+
+    def __init__(self, connect, size=5, timeout=5.0, ping_after=30.0, dialect="mysql"):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self.dialect = dialect
+        self.observer = None  # called with the seconds each query took (metrics.py)
+
+        self._idle = queue.LifoQueue()
+        self._inherited = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._counters = {
+            "created": 0,
+            "checkouts": 0,
+            "in_use": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_seconds": 0.0
+        }
+
+    def reset_after_fork(self):
+        """Forget connections inherited from a parent process; call first thing in a forked worker.
+
+        The parent keeps using its sockets, so they are set aside here, not
+        closed, and stay referenced so garbage collection never closes them either.
+        """
+        while True:
+            try:
+                self._inherited.append(self._idle.get_nowait()[0])
+            except queue.Empty:
+                break
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self._counters, 0)
+        self._counters["wait_seconds"] = 0.0
+
+    def _count(self, key, delta=1):
+        with self._lock:
+            self._counters[key] += delta
+
+    def _healthy(self, conn):
+        try:
+            if self.dialect == "mysql":
+                conn.ping(reconnect=False)
+            else:
+                conn.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        self._count("discarded")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _acquire(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("timeouts")
+            raise PoolTimeout(f"No database connection free after {self.timeout}s")
+        self._count("wait_seconds", time.monotonic() - started)
+
+        try:
+            while True:
+                try:
+                    conn, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = self._connect()
+                    self._count("created")
+                    break
+                if time.monotonic() - last_used < self.ping_after or self._healthy(conn):
+                    break
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+        self._count("checkouts")
+        self._count("in_use")
+        return conn
+
+    def _release(self, conn, broken=False):
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+        self._count("in_use", -1)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; rolled back and returned to the pool on exit."""
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        finally:
+            # Also after reads: MySQL (autocommit off, REPEATABLE READ) would otherwise keep the
+            # first SELECT's snapshot open and never show rows ingested after it
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            self._release(conn, broken)
+
+    def _sql(self, sql):
+        # Queries are written MySQL-style; sqlite uses qmark placeholders
+        return sql.replace("%s", "?") if self.dialect == "sqlite" else sql
+
+    def _cursor(self, conn):
+        return conn.cursor(dictionary=True) if self.dialect == "mysql" else conn.cursor()
+
+    def _observe(self, started):
+        if self.observer is not None:
+            self.observer(time.perf_counter() - started)
+
+    def fetchall(self, sql, params=()):
+        with self.connection() as conn:
+            started = time.perf_counter()
+            c = self._cursor(conn)
+            c.execute(self._sql(sql), params)
+            rows = c.fetchall()
+            c.close()
+            self._observe(started)
+            return rows
+
+    def fetchone(self, sql, params=()):
+        rows = self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    def execute(self, sql, params=()):
+        with self.connection() as conn:
+            started = time.perf_counter()
+            c = conn.cursor()
+            c.execute(self._sql(sql), params)
+            conn.commit()
+            c.close()
+            self._observe(started)
+
+    def executemany(self, sql, seq_of_params):
+        with self.connection() as conn:
+            started = time.perf_counter()
+            c = conn.cursor()
+            c.executemany(self._sql(sql), seq_of_params)
+            conn.commit()
+            c.close()
+            self._observe(started)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        checkouts = counters["checkouts"] or 1
+        return {
+            "dialect": self.dialect,
+            "size": self.size,
+            "in_use": counters["in_use"],
+            "idle": self._idle.qsize(),
+            "created": counters["created"],
+            "checkouts": counters["checkouts"],
+            "timeouts": counters["timeouts"],
+            "discarded": counters["discarded"],
+            "avg_wait_ms": round(1000 * counters["wait_seconds"] / checkouts, 3)
+        }
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+# -----------------------
+# Process-wide pool
+# -----------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def create_pool():
+    """Build a pool from the environment.
+
+    DB_BACKEND=sqlite swaps MySQL for a local SQLite file (DB_SQLITE_PATH),
+    defaulting to a shared in-memory database for tests.
+    """
+    size = int(os.getenv("DB_POOL_SIZE", 5))
+    timeout = float(os.getenv("DB_POOL_TIMEOUT", 5.0))
+    ping_after = float(os.getenv("DB_POOL_PING_AFTER", 30.0))
+
+    if os.getenv("DB_BACKEND", "mysql") == "sqlite":
+        path = os.getenv("DB_SQLITE_PATH", "file:satellite_data?mode=memory&cache=shared")
+        return ConnectionPool(lambda: sqlite_connect(path), size, timeout, ping_after, dialect="sqlite")
+
+    config = db_config()
+    return ConnectionPool(lambda: mysql_connect(config), size, timeout, ping_after, dialect="mysql")
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_pool()
+        return _pool
+
+
+# -----------------------
+# Single-statement upserts (readers never see a key missing in between)
+# -----------------------
+def replace_sql(dialect, table, key_columns, value_columns):
+    """INSERT of one row that overwrites `value_columns` when the key already exists."""
+    columns = list(key_columns) + list(value_columns)
+    placeholders = ",".join(["%s"] * len(columns))
+    if dialect == "sqlite":
+        updates = ", ".join(f"{col}=excluded.{col}" for col in value_columns)
+        conflict = f"ON CONFLICT({', '.join(key_columns)}) DO UPDATE SET {updates}"
+    else:
+        updates = ", ".join(f"{col}=VALUES({col})" for col in value_columns)
+        conflict = f"ON DUPLICATE KEY UPDATE {updates}"
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) {conflict}"
+
+
+# -----------------------
+# Ingestion bookkeeping tables
+# -----------------------
+def init_ingest_tables(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_state (
+            id INT PRIMARY KEY,
+            generation BIGINT NOT NULL
+        )
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS soil_index_bounds (
+            id INT PRIMARY KEY,
+            soil_min DOUBLE,
+            soil_max DOUBLE
+        )
+    """)
+
+
+def bump_generation(db):
+    """Mark crop_stats as changed so API-side caches refresh on their next read."""
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE ingest_state SET generation = generation + 1 WHERE id = 1")
+        if c.rowcount == 0:
+            c.execute("INSERT INTO ingest_state (id, generation) VALUES (1, 1)")
+        conn.commit()
+        c.close()
+
+
+def current_generation(db):
+    row = db.fetchone("SELECT generation FROM ingest_state WHERE id = 1")
+    return row["generation"] if row else 0
+
+
+# -----------------------
+# Soil index bounds (maintained on insert instead of rescanning crop_stats)
+# -----------------------
+SOIL_INDEX_SQL = "(0.3 * NDVI_mean + 0.3 * NDWI_mean + 0.2 * (1 - ABS(NDSI_mean)) + 0.2 * SWIR_mean)"
+
+
+def soil_index(ndvi, ndwi, ndsi, swir):
+    return 0.3 * ndvi + 0.3 * ndwi + 0.2 * (1 - abs(ndsi)) + 0.2 * swir
+
+
+def update_soil_index_bounds(db, stats_rows):
+    """Widen the stored min/max with newly inserted crop_stats rows.
+
+    Bounds only ever widen: overwriting an existing date with a value closer
+    to the middle keeps the old extreme until the summary is rebuilt.
+    """
+    values = []
+    for stats in stats_rows:
+        inputs = [stats.get(k) for k in ("NDVI_mean", "NDWI_mean", "NDSI_mean", "SWIR_mean")]
+        if all(v is not None for v in inputs):
+            values.append(soil_index(*inputs))
+    if not values:
+        return
+    low, high = min(values), max(values)
+
+    # An upsert, since MySQL's rowcount counts changed rows: an UPDATE that doesn't widen reports 0
+    new = "excluded.{}" if db.dialect == "sqlite" else "VALUES({})"
+    widen = ", ".join(
+        f"{col} = CASE WHEN {col} IS NULL OR {new.format(col)} {op} {col} THEN {new.format(col)} ELSE {col} END"
+        for col, op in (("soil_min", "<"), ("soil_max", ">"))
+    )
+    conflict = "ON CONFLICT(id) DO UPDATE SET" if db.dialect == "sqlite" else "ON DUPLICATE KEY UPDATE"
+    db.execute(f"INSERT INTO soil_index_bounds (id, soil_min, soil_max) VALUES (1, %s, %s) {conflict} {widen}",
+               (low, high))
+
+
+def rebuild_soil_index_bounds(db):
+    """Recompute the bounds with a single SQL aggregate and store them."""
+    row = db.fetchone(f"SELECT MIN({SOIL_INDEX_SQL}) AS soil_min, MAX({SOIL_INDEX_SQL}) AS soil_max FROM crop_stats")
+    if not row or row["soil_min"] is None:
+        return None
+    db.execute(replace_sql(db.dialect, "soil_index_bounds", ["id"], ["soil_min", "soil_max"]),
+               (1, row["soil_min"], row["soil_max"]))
+    return row["soil_min"], row["soil_max"]
+
+
+def read_soil_index_bounds(db):
+    row = db.fetchone("SELECT soil_min, soil_max FROM soil_index_bounds WHERE id = 1")
+    if row and row["soil_min"] is not None:
+        return row["soil_min"], row["soil_max"]
+    return rebuild_soil_index_bounds(db) or (0, 1)  # fallback
+
+
+# -----------------------
+# Schema: crop_stats (one row per farm per acquisition date) and the farm registry
+# -----------------------
+STAT_BANDS = ["NDVI", "NDWI", "NDSI", "SWIR", "FalseColor", "TCI"]
+STAT_COLUMNS = [f"{band}_{stat}" for band in STAT_BANDS for stat in ("mean", "median", "std")]
+CROP_STATS_COLUMNS = ["farm_id", "timestamp"] + STAT_COLUMNS
+DEFAULT_FARM_ID = 1
+
+
+def has_column(db, table, column):
+    if db.dialect == "sqlite":
+        return any(r["name"] == column for r in db.fetchall(f"PRAGMA table_info({table})"))
+    row = db.fetchone(
+        "SELECT COUNT(*) AS n FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column)
+    )
+    return row["n"] > 0
+
+
+def init_crop_stats(db, timestamp_type="VARCHAR(20)"):
+    """Create crop_stats as of schema version 1; migrations.py moves it forward."""
+    stat_columns = ",\n            ".join(f"{col} DOUBLE" for col in STAT_COLUMNS)
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS crop_stats (
+            farm_id INT NOT NULL DEFAULT {DEFAULT_FARM_ID},
+            timestamp {timestamp_type} NOT NULL,
+            {stat_columns},
+            PRIMARY KEY (farm_id, timestamp)
+        )
+    """)
+    if has_column(db, "crop_stats", "farm_id"):
+        return
+
+    # Pre-registry tables were keyed by timestamp only; existing rows belong to the default farm
+    if db.dialect == "sqlite":
+        # SQLite can't change a primary key in place, so rebuild the table
+        columns = ", ".join(["timestamp"] + STAT_COLUMNS)
+        db.execute("ALTER TABLE crop_stats RENAME TO crop_stats_old")
+        init_crop_stats(db)
+        db.execute(f"INSERT INTO crop_stats (farm_id, {columns}) SELECT {DEFAULT_FARM_ID}, {columns} FROM crop_stats_old")
+        db.execute("DROP TABLE crop_stats_old")
+    else:
+        db.execute(f"""
+            ALTER TABLE crop_stats
+                ADD COLUMN farm_id INT NOT NULL DEFAULT {DEFAULT_FARM_ID} FIRST,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (farm_id, timestamp)
+        """)
+
+
+def init_farms(db):
+    id_column = "INTEGER PRIMARY KEY" if db.dialect == "sqlite" else "INT AUTO_INCREMENT PRIMARY KEY"
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS farms (
+            farm_id {id_column},
+            name VARCHAR(100) NOT NULL,
+            polygon TEXT NOT NULL
+        )
+    """)
+
+
+def seed_default_farm(db, default_coords):
+    """Register `default_coords` as farm 1 unless it already exists."""
+    if db.fetchone("SELECT farm_id FROM farms WHERE farm_id = %s", (DEFAULT_FARM_ID,)) is None:
+        db.execute("INSERT INTO farms (farm_id, name, polygon) VALUES (%s, %s, %s)",
+                   (DEFAULT_FARM_ID, "default", json.dumps(default_coords)))
+
+
+def add_farm(db, name, coords):
+    with db.connection() as conn:
+        c = conn.cursor()
+        c.execute(db._sql("INSERT INTO farms (name, polygon) VALUES (%s, %s)"), (name, json.dumps(coords)))
+        conn.commit()
+        farm_id = c.lastrowid
+        c.close()
+    return farm_id
+
+
+def list_farms(db):
+    rows = db.fetchall("SELECT farm_id, name, polygon FROM farms ORDER BY farm_id")
+    return [{"farm_id": r["farm_id"], "name": r["name"], "coords": json.loads(r["polygon"])} for r in rows]
+
+
+def init_truecolor_images(db, timestamp_type="VARCHAR(20)"):
+    db.execute(f"""
+        CREATE TABLE IF NOT EXISTS truecolor_images (
+            farm_id INT NOT NULL,
+            timestamp {timestamp_type} NOT NULL,
+            content_hash CHAR(16) NOT NULL,
+            sizes VARCHAR(50) NOT NULL,
+            PRIMARY KEY (farm_id, timestamp)
+        )
+    """)
+
+
+# -----------------------
+# True-color image index (files live in static/truecolor, see image_store.py)
+# -----------------------
+def record_truecolor(db, farm_id, timestamp, content_hash, sizes):
+    db.execute(
+        replace_sql(db.dialect, "truecolor_images", ["farm_id", "timestamp"], ["content_hash", "sizes"]),
+        (farm_id, timestamp, content_hash, ",".join(str(size) for size in sizes))
+    )
+
+
+def find_truecolor(db, farm_id, timestamp):
+    """(content_hash, sizes) of the image stored for a crop_stats row, or None."""
+    row = db.fetchone(
+        "SELECT content_hash, sizes FROM truecolor_images WHERE farm_id = %s AND timestamp = %s",
+        (farm_id, timestamp)
+    )
+    if row is None:
+        return None
+    return row["content_hash"], [int(size) for size in row["sizes"].split(",")]
+
+
+# -----------------------
+# crop_stats writes
+# -----------------------
+def crop_stats_params(farm_id, timestamp, stats):
+    # Earth Engine names the standard deviation "<band>_stdDev"; the table uses "<band>_std"
+    return (farm_id, timestamp) + tuple(
+        stats.get(f"{band}_{stat}") for band in STAT_BANDS for stat in ("mean", "median", "stdDev")
+    )
+
+
+def upsert_crop_stats_sql(dialect):
+    columns = ", ".join(CROP_STATS_COLUMNS)
+    placeholders = ",".join(["%s"] * len(CROP_STATS_COLUMNS))
+    if dialect == "sqlite":
+        updates = ", ".join(f"{col}=excluded.{col}" for col in STAT_COLUMNS)
+        conflict = f"ON CONFLICT(farm_id, timestamp) DO UPDATE SET {updates}"
+    else:
+        updates = ", ".join(f"{col}=VALUES({col})" for col in STAT_COLUMNS)
+        conflict = f"ON DUPLICATE KEY UPDATE {updates}"
+    return f"INSERT INTO crop_stats ({columns}) VALUES ({placeholders}) {conflict}"
+
+
+def upsert_crop_stats(db, rows):
+    """Write (farm_id, timestamp, stats) triples with one executemany upsert.
+
+    Also widens the soil-index bounds and bumps the ingestion generation once
+    for the whole batch.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    db.executemany(upsert_crop_stats_sql(db.dialect), [crop_stats_params(*row) for row in rows])
+    update_soil_index_bounds(db, [stats for _, _, stats in rows])
+    bump_generation(db)
+    return len(rows)
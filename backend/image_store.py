@@ -0,0 +1,59 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from PIL import Image
+
+# -----------------------
+# Content-addressed true-color image pyramid
+# -----------------------
+TRUECOLOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "truecolor")
+PYRAMID_SIZES = [128, 256, 512, 1024]
+IMAGE_FORMAT = "webp"
+
+
+def image_name(content_hash, size):
+    return f"{content_hash}_{size}.{IMAGE_FORMAT}"
+
+
+def _atomic_save(img, path):
+    # Write next to the target and rename, so readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, format=IMAGE_FORMAT, quality=80, method=4)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def write_pyramid(content, out_dir=TRUECOLOR_DIR, sizes=PYRAMID_SIZES):
+    """Save one downloaded image as a WebP pyramid named by its content hash.
+
+    Returns (content_hash, sizes written). Identical scenes map to the same
+    files, and files that already exist are not rewritten.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    content_hash = hashlib.sha256(content).hexdigest()[:16]
+
+    img = Image.open(io.BytesIO(content))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    written = []
+    for size in sorted(sizes, reverse=True):
+        if size > max(img.size) and written:
+            continue  # don't upscale past the source
+        path = os.path.join(out_dir, image_name(content_hash, size))
+        if not os.path.exists(path):
+            level = img.copy()
+            level.thumbnail((size, size), Image.LANCZOS)
+            _atomic_save(level, path)
+        written.append(size)
+    return content_hash, sorted(written)
+
+
+def image_urls(content_hash, sizes, prefix="/images/truecolor"):
+    return {str(size): f"{prefix}/{image_name(content_hash, size)}" for size in sizes}
@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+
+
+# -----------------------
+# TFLite model with the Keras predict() interface
+# -----------------------
+def _interpreter_class():
+    # tflite-runtime (or LiteRT) is a few MB and doesn't pull in TensorFlow; full TF works too
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class LiteModel:
+    """Serves a .tflite file written by tasks/export_models.py in place of a Keras model.
+
+    `predict(batch)` and `input_shape` match tf.keras, so the registry,
+    warmup and micro-batcher use it unchanged. Interpreters aren't
+    thread-safe, so each thread gets its own over the same model bytes;
+    the input tensor is resized whenever the batch size changes.
+    """
+
+    def __init__(self, path, num_threads=1):
+        with open(path, "rb") as f:
+            self.content = f.read()
+        self.num_threads = num_threads
+        self._Interpreter = _interpreter_class()
+        self._local = threading.local()
+
+        probe = self._Interpreter(model_content=self.content)
+        self.input_shape = (None,) + tuple(int(d) for d in probe.get_input_details()[0]["shape"][1:])
+
+    def _interpreter(self):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            interpreter = self._Interpreter(model_content=self.content, num_threads=self.num_threads)
+            interpreter.allocate_tensors()
+            state = self._local.state = [interpreter, None]
+        return state
+
+    def predict(self, batch, verbose=0):
+        state = self._interpreter()
+        interpreter = state[0]
+        batch = np.asarray(batch, dtype=np.float32)
+        inp = interpreter.get_input_details()[0]
+        out = interpreter.get_output_details()[0]
+
+        if state[1] != len(batch):
+            interpreter.resize_tensor_input(inp["index"], (len(batch),) + self.input_shape[1:])
+            interpreter.allocate_tensors()
+            state[1] = len(batch)
+
+        # Fully int8 models take and return quantized tensors
+        scale, zero_point = inp["quantization"]
+        if inp["dtype"] != np.float32 and scale:
+            batch = np.round(batch / scale + zero_point).astype(inp["dtype"])
+        interpreter.set_tensor(inp["index"], batch)
+        interpreter.invoke()
+        result = interpreter.get_tensor(out["index"])
+
+        scale, zero_point = out["quantization"]
+        if out["dtype"] != np.float32 and scale:
+            result = (result.astype(np.float32) - zero_point) * scale
+        return result
@@ -0,0 +1,282 @@
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# -----------------------
+# In-process metrics in Prometheus text format
+# -----------------------
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics:
+    """Counters, gauges and fixed-bucket histograms, cheap enough to leave on.
+
+    Recording is a dict lookup, a bisect and one uncontended lock, with no
+    allocation once a series exists. `stage` times one part of a request
+    (db, decode, preprocess, inference, serialize) under the route currently
+    served by this thread, as set by `instrument`.
+
+    With `snapshot_dir` set (serve.py does this for its workers) every
+    process writes its series to <snapshot_dir>/<pid>.json every
+    `flush_interval` seconds, and `render` merges all of them, so a scrape
+    that lands on any one worker reports the whole server. Gauges of
+    processes that have exited are dropped; their counters and histograms
+    are kept so totals never go backwards.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, snapshot_dir=None, flush_interval=5.0):
+        self.buckets = tuple(buckets)
+        self.snapshot_dir = snapshot_dir
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._meta = {}  # name -> (type, help)
+        self._counters = {}  # (name, labels) -> value
+        self._gauges = {}
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., +Inf count, sum]
+        self._local = threading.local()
+        self._flusher = None
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    # -- recording
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add(self, name, delta, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + delta
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            h[i] += 1
+            h[-1] += seconds
+        if self.snapshot_dir and self._flusher is None:
+            self._start_flusher()
+
+    @contextmanager
+    def time(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # -- per-request stages
+    @property
+    def route(self):
+        return getattr(self._local, "route", "none")
+
+    @route.setter
+    def route(self, value):
+        self._local.route = value
+
+    def observe_stage(self, stage, seconds):
+        self.observe("stage_duration_seconds", seconds, route=self.route, stage=stage)
+
+    @contextmanager
+    def stage(self, stage, model=None):
+        """Time a block as `stage` of the current route; with `model`, also as that model's inference."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe_stage(stage, seconds)
+            if model is not None:
+                self.observe("model_inference_seconds", seconds, model=model)
+
+    def stream(self, iterable, stage=None):
+        """Wrap a streamed response body so the stages it records keep the current route.
+
+        The body is consumed after the view returns, when the route has been
+        reset; with `stage`, the total time spent producing chunks is also
+        recorded as one observation of that stage.
+        """
+        route = self.route  # captured now, while the view is running
+
+        def body():
+            iterator = iter(iterable)
+            spent = 0.0
+            try:
+                while True:
+                    previous, self.route = self.route, route
+                    started = time.perf_counter()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        spent += time.perf_counter() - started
+                        self.route = previous
+                    yield item
+            finally:
+                if stage is not None:
+                    self.observe("stage_duration_seconds", spent, route=route, stage=stage)
+
+        return body()
+
+    # -- export
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self._counters.items()],
+                "gauges": [[name, labels, value] for (name, labels), value in self._gauges.items()],
+                "histograms": [[name, labels, list(h)] for (name, labels), h in self._histograms.items()]
+            }
+
+    def _flush(self):
+        path = os.path.join(self.snapshot_dir, f"{os.getpid()}.json")
+        fd, tmp = tempfile.mkstemp(dir=self.snapshot_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def _start_flusher(self):
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self._flush()
+                except OSError as e:
+                    print(f"Metrics snapshot failed: {e}")
+
+        # Started on first use so the thread lives in the worker, not a pre-fork master
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=run, name="metrics-flusher", daemon=True)
+                self._flusher.start()
+
+    def _collect(self):
+        if not self.snapshot_dir:
+            return [self.snapshot()]
+        self._flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.snapshot_dir, "*.json")):
+            pid = int(os.path.basename(path)[:-5])
+            try:
+                with open(path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue  # replaced mid-read; picked up on the next scrape
+            if not _alive(pid):
+                snap["gauges"] = []
+            snapshots.append(snap)
+        return snapshots
+
+    def render(self):
+        counters, gauges, histograms = {}, {}, {}
+        for snap in self._collect():
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, value in snap["gauges"]:
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0) + value
+            for name, labels, h in snap["histograms"]:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, [0] * len(h))
+                for i, v in enumerate(h):
+                    merged[i] += v
+
+        lines = []
+        for series, kind in ((counters, "counter"), (gauges, "gauge"), (histograms, "histogram")):
+            for name in sorted({name for name, _ in series}):
+                lines.append(f"# HELP {name} {self._meta.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name != name:
+                        continue
+                    if kind == "histogram":
+                        lines.extend(self._histogram_lines(name, labels, value))
+                    else:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _histogram_lines(self, name, labels, h):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), h[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}"
+        yield f"{name}_sum{_labels(labels)} {_number(h[-1])}"
+        yield f"{name}_count{_labels(labels)} {cumulative}"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+# -----------------------
+# Flask wiring: per-route latency, status codes and in-flight requests
+# -----------------------
+def instrument(app, metrics):
+    from flask import g, request
+
+    metrics.describe("http_requests_total", "counter", "Requests by route, method and status code")
+    metrics.describe("http_request_errors_total", "counter", "Responses with status >= 400 by route and status")
+    metrics.describe("http_requests_in_flight", "gauge", "Requests currently being served")
+    metrics.describe("http_request_duration_seconds", "histogram", "Request latency by route")
+    metrics.describe("stage_duration_seconds", "histogram",
+                     "Time in each request stage (db, decode, preprocess, inference, serialize)")
+    metrics.describe("model_inference_seconds", "histogram", "Model predict calls by model")
+
+    @app.before_request
+    def _start():
+        # The URL rule, not the path, keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.route = route
+        g._metrics_started = time.perf_counter()
+        metrics.add("http_requests_in_flight", 1, route=route)
+
+    @app.after_request
+    def _status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return
+        route = metrics.route
+        status = 500 if exc is not None else g.pop("_metrics_status", 500)
+        metrics.add("http_requests_in_flight", -1, route=route)
+        metrics.observe("http_request_duration_seconds", time.perf_counter() - started,
+                        route=route, method=request.method)
+        metrics.inc("http_requests_total", route=route, method=request.method, status=str(status))
+        if status >= 400:
+            metrics.inc("http_request_errors_total", route=route, status=str(status))
+        metrics.route = "none"
@@ -0,0 +1,106 @@
+import sys
+from datetime import datetime
+
+from db import (
+    get_pool, init_crop_stats, init_farms, seed_default_farm, init_ingest_tables, init_truecolor_images,
+    CROP_STATS_COLUMNS
+)
+
+# -----------------------
+# Versioned schema migrations
+#
+# Each migration runs once, in order, and is recorded in schema_migrations.
+# Ingestion jobs apply pending migrations on start (init_schema); run
+# `python migrations.py` to apply them by hand, `python migrations.py status`
+# to see where a database is.
+# -----------------------
+def _baseline(db):
+    # Schema as the ingestion scripts created it before migrations existed:
+    # timestamp-only crop_stats tables are moved to the (farm_id, timestamp) key here
+    init_crop_stats(db)
+    init_farms(db)
+    init_ingest_tables(db)
+    init_truecolor_images(db)
+
+
+def _rebuild_sqlite(db, table, create, columns):
+    # SQLite can't change a column type in place: copy into a freshly declared table
+    columns = ", ".join(columns)
+    db.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    create(db)
+    db.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_old")
+    db.execute(f"DROP TABLE {table}_old")
+
+
+def _timestamp_to_date(db):
+    # 'YYYY-MM-DD' strings convert in place; the (farm_id, timestamp) primary key
+    # becomes a range-scannable date index, the extra index serves cross-farm date scans
+    if db.dialect == "sqlite":
+        _rebuild_sqlite(db, "crop_stats", lambda d: init_crop_stats(d, "DATE"), CROP_STATS_COLUMNS)
+        _rebuild_sqlite(db, "truecolor_images", lambda d: init_truecolor_images(d, "DATE"),
+                        ["farm_id", "timestamp", "content_hash", "sizes"])
+    else:
+        db.execute("ALTER TABLE crop_stats MODIFY timestamp DATE NOT NULL")
+        db.execute("ALTER TABLE truecolor_images MODIFY timestamp DATE NOT NULL")
+    db.execute("CREATE INDEX crop_stats_timestamp ON crop_stats (timestamp)")
+
+
+MIGRATIONS = [
+    (1, "farm registry, (farm_id, timestamp) crop_stats key, ingest and image tables", _baseline),
+    (2, "crop_stats and truecolor_images timestamp VARCHAR -> DATE", _timestamp_to_date),
+]
+
+
+def _init_migrations_table(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at VARCHAR(20) NOT NULL
+        )
+    """)
+
+
+def current_version(db):
+    _init_migrations_table(db)
+    row = db.fetchone("SELECT MAX(version) AS version FROM schema_migrations")
+    return row["version"] or 0
+
+
+def migrate(db, target=None):
+    """Apply pending migrations up to `target` (default: latest); returns the versions applied."""
+    version = current_version(db)
+    applied = []
+    for number, name, run in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        print(f"Applying migration {number}: {name}")
+        run(db)
+        db.execute("INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+                   (number, name, datetime.now().isoformat(timespec="seconds")))
+        applied.append(number)
+    return applied
+
+
+def status(db):
+    version = current_version(db)
+    return [{"version": number, "name": name, "applied": number <= version} for number, name, _ in MIGRATIONS]
+
+
+def init_schema(db, default_coords):
+    migrate(db)
+    seed_default_farm(db, default_coords)
+
+
+if __name__ == "__main__":
+    # python migrations.py [status | up [version]]
+    pool = get_pool()
+    command = sys.argv[1] if len(sys.argv) > 1 else "up"
+    if command == "status":
+        for m in status(pool):
+            print(f"{'x' if m['applied'] else ' '} {m['version']:>3}  {m['name']}")
+    elif command == "up":
+        applied = migrate(pool, int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        print(f"✅ Schema at version {current_version(pool)} ({len(applied)} applied)")
+    else:
+        sys.exit(f"Unknown command: {command}")
@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import joblib
+
+
+# -----------------------
+# Model registry with lazy/parallel loading, warmup and mtime-based hot reload
+# -----------------------
+class _Entry:
+    def __init__(self, name, path, loader, warmup, fork_safe):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.warmup = warmup
+        self.fork_safe = fork_safe
+        self.model = None
+        self.mtime_ns = None
+        self.size = None
+        self.version = 0
+        self.loaded_at = None
+        self.checked_at = 0.0
+        self.state = "pending"  # pending -> loading -> ready | failed
+        self.error = None
+        self.failed_stat = None  # (mtime_ns, size) of the file whose load last failed
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.ready = threading.Event()
+        self.reload_lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Loads each artifact once and shares it across requests.
+
+    Artifacts are registered up front and loaded by `start`: serially
+    ("eager"), on a thread pool in the background ("parallel") or on first
+    use ("lazy"). Each load is followed by an optional warmup inference so
+    the first real request doesn't pay graph-building costs.
+
+    Artifacts registered with `fork_safe=False` (TensorFlow models: the TF
+    runtime can't survive a fork) are left out when a pre-forking server
+    loads `names(fork_safe=True)` in the master; each worker then loads them
+    itself after the fork.
+
+    `get` re-stats the file at most every `check_interval` seconds and, if its
+    mtime or size changed, loads and warms up the new artifact before swapping
+    it in, so requests always see either the old or the new model, never a
+    partial one. A failed artifact is retried the same way once it appears
+    or changes.
+    """
+
+    def __init__(self, base_dir="models", check_interval=2.0):
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self._entries = {}
+
+    def register(self, name, filename, loader=joblib.load, warmup=None, fork_safe=True):
+        self._entries[name] = _Entry(name, os.path.join(self.base_dir, filename), loader, warmup, fork_safe)
+
+    def names(self, fork_safe=None):
+        return [name for name, e in self._entries.items() if fork_safe is None or e.fork_safe == fork_safe]
+
+    def start(self, mode="parallel", workers=4, names=None):
+        """Load every registered artifact, or only the still-pending ones in `names`."""
+        if names is None:
+            entries = list(self._entries.values())
+        else:
+            entries = [self._entries[name] for name in names if self._entries[name].state == "pending"]
+        if mode == "eager":
+            for entry in entries:
+                self._load(entry)
+        elif mode == "parallel":
+            # Returns immediately; routes that need a model block until it is ready
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-loader")
+            for entry in entries:
+                entry.state = "loading"  # queued: `state` tells callers a load is already under way
+                executor.submit(self._load, entry)
+            executor.shutdown(wait=False)
+        elif mode != "lazy":
+            raise ValueError(f"Unknown model loading mode: {mode}")
+
+    def _load(self, entry):
+        with entry.reload_lock:
+            st = None
+            try:
+                # Inside the try: a missing artifact must mark the entry failed, not leave it pending
+                st = os.stat(entry.path)
+                if (st.st_mtime_ns, st.st_size) == (entry.mtime_ns, entry.size):
+                    return  # another thread already loaded this version
+                if entry.model is None:
+                    entry.state = "loading"
+
+                started = time.perf_counter()
+                model = entry.loader(entry.path)
+                loaded = time.perf_counter()
+                if entry.warmup is not None:
+                    entry.warmup(model)
+                warmed = time.perf_counter()
+            except Exception as e:
+                entry.error = str(e)
+                entry.failed_stat = (st.st_mtime_ns, st.st_size) if st is not None else None
+                if entry.model is None:
+                    entry.state = "failed"
+                    entry.ready.set()
+                    print(f"Loading model '{entry.name}' from {entry.path} failed: {e}")
+                raise
+
+            # Single attribute assignments are atomic under the GIL
+            entry.model = model
+            entry.mtime_ns, entry.size = st.st_mtime_ns, st.st_size
+            entry.version += 1
+            entry.loaded_at = datetime.now().isoformat(timespec="seconds")
+            entry.load_seconds = round(loaded - started, 3)
+            entry.warmup_seconds = round(warmed - loaded, 3)
+            entry.state, entry.error, entry.failed_stat = "ready", None, None
+            entry.ready.set()
+            print(f"Loaded model '{entry.name}' v{entry.version} from {entry.path} "
+                  f"in {entry.load_seconds}s (warmup {entry.warmup_seconds}s)")
+
+    def get(self, name):
+        entry = self._entries[name]
+
+        if entry.state == "pending":
+            self._load(entry)  # lazy mode: first use pays the load
+        if not entry.ready.is_set():
+            entry.ready.wait()
+
+        # Also after a failed load: a file that appears or changes is loaded without a restart
+        now = time.monotonic()
+        if now - entry.checked_at >= self.check_interval:
+            entry.checked_at = now
+            try:
+                st = os.stat(entry.path)
+                if (st.st_mtime_ns, st.st_size) not in ((entry.mtime_ns, entry.size), entry.failed_stat):
+                    self._load(entry)
+            except Exception as e:
+                if entry.model is not None:
+                    # Keep serving the last good model if the new file is missing or half-written
+                    print(f"Reload of model '{name}' failed, keeping v{entry.version}: {e}")
+        if entry.model is None:
+            raise RuntimeError(f"Model '{name}' failed to load: {entry.error}")
+        return entry.model
+
+    def version(self, name):
+        entry = self._entries[name]
+        return f"{entry.version}:{entry.mtime_ns}"
+
+    def state(self, name):
+        """"pending" (not started, loads on first get), "loading", "ready" or "failed"."""
+        return self._entries[name].state
+
+    def is_ready(self):
+        return all(e.state == "ready" for e in self._entries.values())
+
+    def versions(self):
+        return {
+            name: {
+                "path": e.path,
+                "state": e.state,
+                "version": e.version,
+                "mtime": datetime.fromtimestamp(e.mtime_ns / 1e9).isoformat(timespec="seconds") if e.mtime_ns else None,
+                "loaded_at": e.loaded_at,
+                "load_seconds": e.load_seconds,
+                "warmup_seconds": e.warmup_seconds,
+                "error": e.error
+            }
+            for name, e in self._entries.items()
+        }
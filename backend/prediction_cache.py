@@ -0,0 +1,86 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+# -----------------------
+# Bounded LRU/TTL cache of model outputs keyed by input
+# -----------------------
+def input_key(*parts):
+    """16-byte digest of the canonical form of an input (bytes, str or numpy arrays)."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if hasattr(part, "tobytes"):
+            h.update(str(part.shape).encode())
+            part = part.tobytes()
+        elif isinstance(part, str):
+            part = part.encode()
+        h.update(len(part).to_bytes(8, "little"))
+        h.update(part)
+    return h.digest()
+
+
+class PredictionCache:
+    """Caches deterministic predictions for up to `ttl` seconds, at most `max_entries` of them.
+
+    Entries belong to one model version (ModelRegistry.version); the first
+    lookup with a different version drops them all, so a hot-reloaded
+    artifact never serves results of the old one.
+    """
+
+    def __init__(self, name, max_entries=10000, ttl=3600.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._version = None
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._invalidations = 0
+
+    def get_or_compute(self, version, key, compute):
+        """Returns (value, hit). `compute` runs outside the lock on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                if self._version is not None:
+                    self._invalidations += 1
+                self._entries.clear()
+                self._version = version
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1], True
+            if entry is not None:
+                del self._entries[key]
+                self._expired += 1
+            self._misses += 1
+
+        value = compute()
+        with self._lock:
+            if version == self._version:  # not invalidated while computing
+                self._entries[key] = (now + self.ttl, value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value, False
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "model_version": self._version,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "expired": self._expired,
+                "invalidations": self._invalidations
+            }
@@ -0,0 +1,123 @@
+import gc
+import glob
+import os
+import sys
+import tempfile
+
+# -----------------------
+# Production server: pre-forking gunicorn with models shared copy-on-write
+#
+#   python serve.py                     # serve on 0.0.0.0:$FLASK_PORT
+#   python serve.py memory <master pid>  # memory of the master and each worker
+#
+# The master imports app.py and loads every fork-safe artifact (sklearn,
+# XGBoost, joblib) once, then freezes the GC so collections in the workers
+# don't write to - and so copy - the shared pages. TensorFlow can't be used
+# across a fork, so each worker loads the Keras models itself, with its
+# share of the cores as TF intra-op threads.
+#
+# WEB_WORKERS     worker processes (default: one per core)
+# WEB_THREADS     request threads per worker (default 4)
+# WEB_TIMEOUT     seconds before a stuck worker is restarted (default 120)
+# METRICS_DIR     where workers share /metrics snapshots (default: a fresh temp dir)
+# TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS   per worker (default cores / workers, and 1)
+#
+# Needs gunicorn (pip install gunicorn) and Linux.
+# -----------------------
+def process_memory(pid="self"):
+    """RSS, PSS and shared/private memory of a process in MiB, from /proc/<pid>/smaps_rollup.
+
+    PSS splits every shared page between the processes mapping it, so the
+    PSS of the master plus all workers is the real total.
+    """
+    kb = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                kb[parts[0].rstrip(":")] = int(parts[1])
+    mb = lambda *keys: round(sum(kb.get(k, 0) for k in keys) / 1024, 1)
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty")
+    }
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def print_memory(master_pid):
+    rows = [("master", process_memory(master_pid))]
+    rows += [("worker", process_memory(pid)) for pid in worker_pids(master_pid)]
+    print(f"{'':8}{'pid':>8}{'rss MiB':>10}{'pss MiB':>10}{'shared':>10}{'private':>10}")
+    for role, m in rows:
+        print(f"{role:8}{m['pid']:>8}{m['rss_mb']:>10}{m['pss_mb']:>10}{m['shared_mb']:>10}{m['private_mb']:>10}")
+    print(f"total PSS: {round(sum(m['pss_mb'] for _, m in rows), 1)} MiB "
+          f"(RSS would count {round(sum(m['rss_mb'] for _, m in rows), 1)} MiB)")
+
+
+def server_options():
+    cores = os.cpu_count() or 1
+    workers = int(os.getenv("WEB_WORKERS", cores))
+    threads = int(os.getenv("WEB_THREADS", 4))
+    return {
+        "bind": f"0.0.0.0:{int(os.getenv('FLASK_PORT', 5000))}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "timeout": int(os.getenv("WEB_TIMEOUT", 120)),
+        "preload_app": True,
+        # Read by app.load_keras in each worker, before TensorFlow starts its thread pools
+        "raw_env": [
+            f"TF_INTRA_OP_THREADS={os.getenv('TF_INTRA_OP_THREADS', max(1, cores // workers))}",
+            f"TF_INTER_OP_THREADS={os.getenv('TF_INTER_OP_THREADS', 1)}"
+        ]
+    }
+
+
+def main():
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            self.module = None
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+            self.cfg.set("post_fork", self.post_fork)
+
+        def load(self):
+            # Runs once in the master (preload_app)
+            os.environ["MODEL_LOADING"] = "lazy"  # app.py must not start loader threads before the fork
+            if os.getenv("METRICS_DIR"):
+                for stale in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json")):
+                    os.unlink(stale)  # counters from a previous run
+            else:
+                os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="metrics-")
+            import app as module
+            module.models.start(mode="eager", names=module.models.names(fork_safe=True))
+            gc.collect()
+            gc.freeze()
+            self.module = module
+            return module.app
+
+        def post_fork(self, server, worker):
+            self.module.db.reset_after_fork()
+            self.module.models.start(mode="parallel", names=self.module.models.names(fork_safe=False))
+
+    Server(server_options()).run()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "memory":
+        print_memory(int(sys.argv[2]))
+    else:
+        main()
@@ -0,0 +1,152 @@
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from lite_model import LiteModel
+
+# -----------------------
+# Export the Keras models to TFLite, with a parity check
+#
+#   python export_models.py [quantize=none|float16|dynamic|int8] [samples=256] [images=<dir of jpgs>]
+#                           [min_agreement=0.99]
+#
+# Writes models/<name>.tflite next to each .h5 plus a <name>.tflite.json
+# report comparing the TFLite outputs with Keras on `samples` inputs:
+#   none     float32, same numbers as Keras up to float rounding
+#   float16  weights stored as float16 (half the size), float32 compute
+#   dynamic  weights int8, activations float (smallest without calibration)
+#   int8     weights and activations int8, calibrated on representative inputs:
+#            images from images=<dir> for the CNN, crop_stats windows for the LSTM
+# The export fails if predicted classes agree on less than `min_agreement` of the inputs.
+# Serve the results with INFERENCE_RUNTIME=tflite.
+# -----------------------
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+CNN_INPUT_SIZE = (128, 128)  # as in app.py
+PEST_FEATURES = ["NDVI_mean", "NDWI_mean", "NDSI_mean", "SWIR_mean", "FalseColor_mean", "TCI_mean"]  # app.PEST_FEATURES order
+PEST_WINDOW = 5
+
+EXPORTS = {
+    # name: (keras file, load_model kwargs)
+    "crop_health_model": ("crop_health_model.h5", {}),
+    "pest_risk_lstm_model": ("pest_risk_lstm_model.h5", {"compile": False}),
+}
+
+
+# -----------------------
+# Representative inputs
+# -----------------------
+def cnn_samples(n, image_dir=None):
+    if image_dir:
+        from PIL import Image
+        paths = sorted(glob.glob(os.path.join(image_dir, "*.jp*g")) + glob.glob(os.path.join(image_dir, "*.png")))[:n]
+        if paths:
+            # Same decode as app.preprocess_image
+            return np.stack([
+                np.asarray(Image.open(p).convert("RGB").resize(CNN_INPUT_SIZE), dtype=np.float32) / 255.0
+                for p in paths
+            ])
+    print("No sample images given, using uniform noise (pass images=<dir> for a meaningful int8 calibration)")
+    return np.random.default_rng(0).uniform(0, 1, size=(n,) + CNN_INPUT_SIZE + (3,)).astype(np.float32)
+
+
+def pest_samples(n):
+    try:
+        from db import get_pool
+        rows = get_pool().fetchall(
+            f"SELECT farm_id, {', '.join(PEST_FEATURES)} FROM crop_stats ORDER BY farm_id, timestamp"
+        )
+    except Exception as e:
+        print(f"crop_stats not readable ({e}), using random windows")
+        rows = []
+
+    windows = []
+    for farm_id in sorted({r["farm_id"] for r in rows}):
+        X = np.array([[r[f] for f in PEST_FEATURES] for r in rows if r["farm_id"] == farm_id], dtype=np.float32)
+        if len(X) >= PEST_WINDOW:
+            windows.extend(np.lib.stride_tricks.sliding_window_view(X, (PEST_WINDOW, X.shape[1]))[:, 0])
+    if windows:
+        return np.nan_to_num(np.stack(windows[-n:]))
+    return np.random.default_rng(0).normal(size=(n, PEST_WINDOW, len(PEST_FEATURES))).astype(np.float32)
+
+
+# -----------------------
+# Conversion and parity
+# -----------------------
+def convert(model, quantize, samples):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize != "none":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        # Inputs/outputs stay float32 so the app feeds the same arrays as to Keras
+        converter.representative_dataset = lambda: ([x[None]] for x in samples)
+    elif quantize not in ("none", "dynamic"):
+        raise ValueError(f"Unknown quantization: {quantize}")
+    return converter.convert()
+
+
+def classes(outputs):
+    # Binary CNN outputs one sigmoid, the LSTM a softmax over risk levels
+    return (outputs[:, 0] > 0.5).astype(int) if outputs.shape[1] == 1 else outputs.argmax(axis=1)
+
+
+def parity(keras_model, lite_model, samples):
+    expected = keras_model.predict(samples, verbose=0)
+    actual = lite_model.predict(samples)
+    diff = np.abs(expected - actual)
+    return {
+        "samples": int(len(samples)),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "class_agreement": float((classes(expected) == classes(actual)).mean())
+    }
+
+
+def export(name, quantize="none", samples=None, min_agreement=0.99):
+    import tensorflow as tf
+
+    filename, kwargs = EXPORTS[name]
+    keras_path = os.path.join(MODELS_DIR, filename)
+    lite_path = os.path.join(MODELS_DIR, f"{name}.tflite")
+
+    keras_model = tf.keras.models.load_model(keras_path, **kwargs)
+    content = convert(keras_model, quantize, samples)
+
+    # Written under a temporary name so a running app never reloads a model that failed parity
+    tmp_path = lite_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    report = {
+        "source": filename,
+        "quantize": quantize,
+        "keras_bytes": os.path.getsize(keras_path),
+        "tflite_bytes": len(content),
+        **parity(keras_model, LiteModel(tmp_path), samples)
+    }
+    with open(lite_path + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+
+    if report["class_agreement"] < min_agreement:
+        os.unlink(tmp_path)
+        raise RuntimeError(f"{name}: TFLite agrees with Keras on only {report['class_agreement']:.1%} of inputs")
+    os.replace(tmp_path, lite_path)
+    print(f"✅ {name}.tflite ({quantize}): {report['keras_bytes']} -> {report['tflite_bytes']} bytes, "
+          f"max |diff| {report['max_abs_diff']:.2e}, class agreement {report['class_agreement']:.1%}")
+    return report
+
+
+if __name__ == "__main__":
+    args = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    quantize = args.get("quantize", "none")
+    n = int(args.get("samples", 256))
+    min_agreement = float(args.get("min_agreement", 0.99))
+
+    export("crop_health_model", quantize, cnn_samples(n, args.get("images")), min_agreement)
+    export("pest_risk_lstm_model", quantize, pest_samples(n), min_agreement)
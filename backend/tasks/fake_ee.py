@@ -0,0 +1,281 @@
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+
+# -----------------------
+# Offline stand-in for the Earth Engine calls made by gee.py, gee2.py and scheduler.py
+#
+# Install it before gee is imported:  sys.modules["ee"] = fake_ee
+# Scenes are added with add_scene(); every getInfo() is counted in `calls`
+# by kind ("metadata", "reduce", "page") so tests can check how much work a
+# run did, and fail_next(n, kind, after) makes n getInfo() calls (of that
+# kind, once `after` more have succeeded) raise EEException. Collections
+# are evaluated only on getInfo(), and reductions return deterministic
+# stats per scene.
+# -----------------------
+BANDS = ["NDVI", "NDWI", "NDSI", "SWIR", "FalseColor", "TCI"]
+
+calls = Counter()
+scenes = []  # {"system:time_start": ms, "CLOUDY_PIXEL_PERCENTAGE": pct, "farms": farm_ids or None}
+_lock = threading.Lock()
+_failures = {}  # kind (None = any) -> [calls still to succeed, calls to fail]
+
+
+class EEException(Exception):
+    pass
+
+
+def Initialize(*args, **kwargs):
+    pass
+
+
+def reset():
+    with _lock:
+        calls.clear()
+        scenes.clear()
+        _failures.clear()
+
+
+def add_scene(date, cloud=5.0, farms=None):
+    """Make a scene acquired on `date` (YYYY-MM-DD) available; its footprint covers `farms` (None = all)."""
+    ms = int(datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+    with _lock:
+        scenes.append({"system:time_start": ms, "CLOUDY_PIXEL_PERCENTAGE": cloud,
+                       "farms": set(farms) if farms is not None else None})
+
+
+def fail_next(n=1, kind=None, after=0):
+    with _lock:
+        _failures[kind] = [after, n]
+
+
+def _scene_stats(scene):
+    # Deterministic per scene so repeated runs write identical rows
+    seed = zlib.crc32(str(scene["system:time_start"]).encode())
+    out = {}
+    for i, band in enumerate(BANDS):
+        mean = ((seed >> i) % 1000) / 1000
+        out.update({f"{band}_mean": mean, f"{band}_median": mean, f"{band}_stdDev": mean / 10})
+    return out
+
+
+class _Value:
+    def __init__(self, kind, compute):
+        self.kind = kind
+        self._compute = compute
+
+    def getInfo(self):
+        with _lock:
+            calls[self.kind] += 1
+            for kind in (self.kind, None):
+                plan = _failures.get(kind)
+                if not plan or not plan[1]:
+                    continue
+                if plan[0]:
+                    plan[0] -= 1
+                    continue
+                plan[1] -= 1
+                raise EEException(f"fake transient Earth Engine error ({self.kind})")
+        return self._compute()
+
+    def get(self, key):
+        return _Value(self.kind, lambda: self._compute()[key])
+
+
+class _Chain:
+    """Any call not modelled below returns the object itself (band math, rename, combine...)."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+
+class Geometry:
+    @staticmethod
+    def Polygon(coords):
+        return _Chain()
+
+
+class Reducer:
+    mean = median = stdDev = staticmethod(lambda: _Chain())
+
+    @staticmethod
+    def toList(n=None):
+        return _Chain()
+
+
+class Filter:
+    @staticmethod
+    def lt(prop, value):
+        return lambda scene: scene[prop] < value
+
+    @staticmethod
+    def eq(prop, value):
+        return lambda scene: scene[prop] == value
+
+    @staticmethod
+    def inList(prop, values):
+        values = list(values)
+        return lambda scene: scene[prop] in values
+
+
+def _to_ms(day):
+    return int(datetime.strptime(str(day), "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class ImageCollection:
+    def __init__(self, name, ops=()):
+        self.name = name
+        self._ops = ops  # ("filter", predicate) / ("map", function), applied in order
+
+    def _with(self, op):
+        return ImageCollection(self.name, self._ops + (op,))
+
+    def _items(self):
+        with _lock:
+            items = [Image(dict(s)) for s in scenes]
+        for op, fn in self._ops:
+            items = [i for i in items if fn(i.scene)] if op == "filter" else [fn(i) for i in items]
+        return items
+
+    def filterBounds(self, geometry):
+        return self
+
+    def filter(self, predicate):
+        return self._with(("filter", predicate))
+
+    def filterDate(self, start, end=None):
+        # As in Earth Engine, a missing end means a one-millisecond window starting at `start`
+        start_ms = _to_ms(start)
+        end_ms = _to_ms(end) if end is not None else start_ms + 1
+        return self.filter(lambda s: start_ms <= s["system:time_start"] < end_ms)
+
+    def map(self, fn):
+        return self._with(("map", fn))
+
+    def sort(self, prop, ascending=True):
+        return self
+
+    def size(self):
+        return _Value("metadata", lambda: len(self._items()))
+
+    def aggregate_max(self, prop):
+        return _Value("metadata", lambda: max((i.scene[prop] for i in self._items()), default=None))
+
+    def aggregate_array(self, prop):
+        return _Value("metadata", lambda: [i.scene[prop] for i in self._items()])
+
+    def reduceColumns(self, reducer, selectors):
+        return _Value("metadata", lambda: {"list": [[i.scene[s] for s in selectors] for i in self._items()]})
+
+    def first(self):
+        found = sorted(self._items(), key=lambda i: i.scene["system:time_start"])
+        return found[-1] if found else Image(None)
+
+
+class _Date:
+    def __init__(self, ms):
+        self.ms = ms
+
+    def format(self, pattern=None):
+        # Only the "YYYY-MM-dd" pattern is used
+        return datetime.fromtimestamp(self.ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class Image(_Chain):
+    def __init__(self, scene):
+        self.scene = scene
+
+    def get(self, prop):
+        return _Value("metadata", lambda: self.scene[prop])
+
+    def set(self, *args):
+        props = args[0] if len(args) == 1 else {args[0]: args[1]}
+        # Server-side values (aggregates) are resolved in place
+        props = {k: v._compute() if isinstance(v, _Value) else v for k, v in props.items()}
+        return Image({**self.scene, **props})
+
+    def date(self):
+        return _Date(self.scene["system:time_start"])
+
+    def geometry(self):
+        return _Footprint(self.scene["farms"])
+
+    def covers(self, feature):
+        return self.scene["farms"] is None or feature.props.get("farm_id") in self.scene["farms"]
+
+    def reduceRegion(self, **kwargs):
+        return _Value("reduce", lambda: _scene_stats(self.scene))
+
+    def reduceRegions(self, collection, **kwargs):
+        def features():
+            stats = _scene_stats(self.scene)
+            outside = dict.fromkeys(stats)  # Earth Engine reduces a polygon off the footprint to nulls
+            return [Feature(None, {**f.props, **(stats if self.covers(f) else outside)})
+                    for f in collection._features()]
+        return FeatureCollection(features)
+
+    def getThumbURL(self, params):
+        calls["thumbnail"] += 1
+        return "https://earthengine.invalid/thumbnail.png"
+
+
+class _Footprint(_Chain):
+    def __init__(self, farms):
+        self.farms = farms
+
+
+class Feature(_Chain):
+    def __init__(self, geometry, props=None):
+        self.geometry = geometry
+        self.props = dict(props or {})
+
+    def setGeometry(self, geometry):
+        return Feature(geometry, self.props)
+
+    def set(self, *args):
+        props = args[0] if len(args) == 1 else {args[0]: args[1]}
+        return Feature(self.geometry, {**self.props, **props})
+
+    def info(self):
+        return {"type": "Feature", "geometry": None, "properties": dict(self.props)}
+
+
+class FeatureCollection(_Chain):
+    def __init__(self, source):
+        # A list of Features, a function returning one, or an ImageCollection mapped to FeatureCollections
+        if isinstance(source, ImageCollection):
+            self._source = lambda: [item for fc in source._items() for item in fc._features()]
+        elif callable(source):
+            self._source = source
+        else:
+            source = list(source)
+            self._source = lambda: source
+
+    def _features(self):
+        return self._source()
+
+    def map(self, fn):
+        return FeatureCollection(lambda: [fn(f) for f in self._features()])
+
+    def filterBounds(self, geometry):
+        if not isinstance(geometry, _Footprint) or geometry.farms is None:
+            return self
+        return FeatureCollection(lambda: [f for f in self._features() if f.props.get("farm_id") in geometry.farms])
+
+    def flatten(self):
+        return self  # nested collections are flattened as they are evaluated
+
+    def size(self):
+        return _Value("metadata", lambda: len(self._features()))
+
+    def aggregate_array(self, prop):
+        return _Value("metadata", lambda: [f.props[prop] for f in self._features()])
+
+    def toList(self, count, offset=0):
+        return _Value("page", lambda: [f.info() for f in self._features()[offset:offset + count]])
+
+    def getInfo(self):
+        return _Value("reduce", lambda: {
+            "type": "FeatureCollection", "features": [f.info() for f in self._features()]
+        }).getInfo()
@@ -1,10 +1,15 @@
 import ee
-import numpy as np
-from PIL import Image
-import io
+import os
+import sys
 import requests
-import mysql.connector
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db import get_pool, list_farms, upsert_crop_stats, record_truecolor, DEFAULT_FARM_ID
+from migrations import init_schema
+from image_store import write_pyramid, TRUECOLOR_DIR
+from gee2 import iter_feature_pages
 
 # -----------------------
 # Initialize GEE with your project
@@ -22,27 +27,34 @@ AOI_COORDS = [[
     [74.873908, 30.273958]
 ]]
 AOI = ee.Geometry.Polygon(AOI_COORDS)
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",  # set your MySQL password here
-    "database": "satellite_data"
-}
-IMAGE_SAVE_PATH = "../static/latest_truecolor.jpg"
+THUMBNAIL_WORKERS = 8  # concurrent thumbnail downloads in main()
 
 # -----------------------
 # Function to fetch latest Sentinel-2 image
 # -----------------------
-def get_latest_sentinel_image(aoi, max_cloud=20):
+def sentinel_collection(aoi, max_cloud=20, since=None):
     collection = (
         ee.ImageCollection("COPERNICUS/S2_SR")
         .filterBounds(aoi)
         .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", max_cloud))
-        .sort("system:time_start", False)
     )
-    latest = collection.first()
+    if since is None:
+        return collection
+    # filterDate without an end matches only the millisecond at `since`; end tomorrow (UTC) instead
+    until = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+    return collection.filterDate(since, until)
+
+def get_latest_sentinel_image(aoi, max_cloud=20):
+    latest = sentinel_collection(aoi, max_cloud).sort("system:time_start", False).first()
     return latest
 
+def latest_scene_time(collection):
+    """system:time_start (ms) of the newest scene, or None: a metadata lookup, no pixels are read."""
+    return collection.aggregate_max("system:time_start").getInfo()
+
+def scene_date(time_start):
+    return datetime.fromtimestamp(time_start / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
 # -----------------------
 # Compute indices
 # -----------------------
@@ -72,85 +84,81 @@ def reduce_stats(image, aoi):
     return stats
 
 # -----------------------
-# Save True Color image
+# Reduce indices over every registered farm in one call
 # -----------------------
-def save_truecolor(image, aoi, path, scale=10):
+def farm_collection(farms):
+    return ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Polygon(farm["coords"]), {"farm_id": farm["farm_id"]})
+        for farm in farms
+    ])
+
+def reduce_farm_stats(image, farms_fc, count, page_size=500, workers=4):
+    """Return {farm_id: stats} from a single reduceRegions pass over all `count` farm polygons.
+
+    The result is fetched in pages (Earth Engine refuses collection queries
+    past 5000 elements), at most `workers` of them in flight.
+    """
+    bands = ["NDVI", "NDWI", "NDSI", "SWIR", "FalseColor", "TCI"]
+    reducers = ee.Reducer.mean().combine(ee.Reducer.median(), "", True).combine(ee.Reducer.stdDev(), "", True)
+    fc = image.select(bands).reduceRegions(collection=farms_fc, reducer=reducers, scale=10)
+    fc = fc.map(lambda f: f.setGeometry(None))
+
+    results = {}
+    for page in iter_feature_pages(fc, count, page_size, workers):
+        for feature in page:
+            stats = dict(feature["properties"])
+            farm_id = stats.pop("farm_id")
+            if stats.get("NDVI_mean") is not None:  # scene doesn't cover this farm
+                results[farm_id] = stats
+    return results
+
+# -----------------------
+# Save True Color image (content-addressed WebP pyramid, one per timestamp)
+# -----------------------
+def save_truecolor(db, image, aoi, timestamp, farm_id=DEFAULT_FARM_ID, out_dir=TRUECOLOR_DIR):
     url = image.visualize(bands=["B4", "B3", "B2"], min=0, max=3000).getThumbURL({
         "region": aoi,
-        "dimensions": 512
+        "dimensions": 1024
     })
     response = requests.get(url)
-    img = Image.open(io.BytesIO(response.content))
-    if img.mode == "RGBA":
-        img = img.convert("RGB")
-    img.save(path)
-    print(f"True color image saved to {path}")
+    response.raise_for_status()
+    content_hash, sizes = write_pyramid(response.content, out_dir)
+    record_truecolor(db, farm_id, timestamp, content_hash, sizes)
+    print(f"True color image {content_hash} saved to {out_dir} at sizes {sizes}")
 
 # -----------------------
 # Database functions
 # -----------------------
-def init_db(config):
-    conn = mysql.connector.connect(**config)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS crop_stats (
-            timestamp VARCHAR(20) PRIMARY KEY,
-            NDVI_mean DOUBLE, NDVI_median DOUBLE, NDVI_std DOUBLE,
-            NDWI_mean DOUBLE, NDWI_median DOUBLE, NDWI_std DOUBLE,
-            NDSI_mean DOUBLE, NDSI_median DOUBLE, NDSI_std DOUBLE,
-            SWIR_mean DOUBLE, SWIR_median DOUBLE, SWIR_std DOUBLE,
-            FalseColor_mean DOUBLE, FalseColor_median DOUBLE, FalseColor_std DOUBLE,
-            TCI_mean DOUBLE, TCI_median DOUBLE, TCI_std DOUBLE
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def save_stats(config, stats):
-    conn = mysql.connector.connect(**config)
-    c = conn.cursor()
-    timestamp = datetime.now().strftime("%Y-%m-%d")
-    sql = """
-        INSERT INTO crop_stats (
-            timestamp,
-            NDVI_mean, NDVI_median, NDVI_std,
-            NDWI_mean, NDWI_median, NDWI_std,
-            NDSI_mean, NDSI_median, NDSI_std,
-            SWIR_mean, SWIR_median, SWIR_std,
-            FalseColor_mean, FalseColor_median, FalseColor_std,
-            TCI_mean, TCI_median, TCI_std
-        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON DUPLICATE KEY UPDATE
-            NDVI_mean=VALUES(NDVI_mean), NDVI_median=VALUES(NDVI_median), NDVI_std=VALUES(NDVI_std),
-            NDWI_mean=VALUES(NDWI_mean), NDWI_median=VALUES(NDWI_median), NDWI_std=VALUES(NDWI_std),
-            NDSI_mean=VALUES(NDSI_mean), NDSI_median=VALUES(NDSI_median), NDSI_std=VALUES(NDSI_std),
-            SWIR_mean=VALUES(SWIR_mean), SWIR_median=VALUES(SWIR_median), SWIR_std=VALUES(SWIR_std),
-            FalseColor_mean=VALUES(FalseColor_mean), FalseColor_median=VALUES(FalseColor_median), FalseColor_std=VALUES(FalseColor_std),
-            TCI_mean=VALUES(TCI_mean), TCI_median=VALUES(TCI_median), TCI_std=VALUES(TCI_std)
-    """
-    c.execute(sql, (
-        timestamp,
-        stats["NDVI_mean"], stats["NDVI_median"], stats["NDVI_stdDev"],
-        stats["NDWI_mean"], stats["NDWI_median"], stats["NDWI_stdDev"],
-        stats["NDSI_mean"], stats["NDSI_median"], stats["NDSI_stdDev"],
-        stats["SWIR_mean"], stats["SWIR_median"], stats["SWIR_stdDev"],
-        stats["FalseColor_mean"], stats["FalseColor_median"], stats["FalseColor_stdDev"],
-        stats["TCI_mean"], stats["TCI_median"], stats["TCI_stdDev"]
-    ))
-    conn.commit()
-    conn.close()
-    print(f"Stats saved to database with timestamp {timestamp}")
-
-# -----------------------
-# Main workflow
+def init_db(db):
+    # Apply pending schema migrations, then seed AOI_COORDS as farm 1
+    init_schema(db, AOI_COORDS)
+
+def save_stats(db, farm_stats, timestamp):
+    upsert_crop_stats(db, [(farm_id, timestamp, stats) for farm_id, stats in farm_stats.items()])
+    print(f"Stats saved to database for {len(farm_stats)} farms with timestamp {timestamp}")
+
+# -----------------------
+# Main workflow (one shot; scheduler.py runs only when a new scene arrives)
 # -----------------------
 def main():
-    init_db(DB_CONFIG)
-    latest = get_latest_sentinel_image(AOI)
+    db = get_pool()
+    init_db(db)
+    farms = list_farms(db)
+    farms_fc = farm_collection(farms)
+    latest = get_latest_sentinel_image(farms_fc.geometry())
     image_with_indices = compute_indices(latest)
-    stats = reduce_stats(image_with_indices, AOI)
-    save_truecolor(latest, AOI, IMAGE_SAVE_PATH)
-    save_stats(DB_CONFIG, stats)
+    farm_stats = reduce_farm_stats(image_with_indices, farms_fc, len(farms))
+    timestamp = scene_date(latest.get("system:time_start").getInfo())  # acquisition date, not today
+
+    # Images first: save_stats bumps the generation that tells the API to look for them.
+    # One thumbnail per farm the scene covers, downloaded concurrently
+    def save_farm_truecolor(farm):
+        save_truecolor(db, latest, ee.Geometry.Polygon(farm["coords"]), timestamp, farm["farm_id"])
+
+    covered = [farm for farm in farms if farm["farm_id"] in farm_stats]
+    with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS) as executor:
+        list(executor.map(save_farm_truecolor, covered))  # re-raises the first failure
+    save_stats(db, farm_stats, timestamp)
 
 if __name__ == "__main__":
     main()
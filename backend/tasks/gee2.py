@@ -1,10 +1,22 @@
+import os
+import sys
+
+if __name__ == "__main__" and sys.argv[1:2] == ["fake"]:
+    # Offline run on fake_ee and an in-memory SQLite database; must precede `import ee`
+    os.environ.setdefault("DB_BACKEND", "sqlite")
+    import fake_ee
+    sys.modules["ee"] = fake_ee
+
 import ee
 import requests
-import mysql.connector
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import io
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db import get_pool, list_farms, upsert_crop_stats, DEFAULT_FARM_ID
+from migrations import init_schema
+
 # -----------------------
 # Initialize GEE
 # -----------------------
@@ -21,12 +33,6 @@ AOI_COORDS = [[
     [74.873908, 30.273958]
 ]]
 AOI = ee.Geometry.Polygon(AOI_COORDS)
-DB_CONFIG = {
-    "host": "localhost",
-    "user": "root",
-    "password": "",
-    "database": "satellite_data"
-}
 
 # -----------------------
 # Compute indices
@@ -58,73 +64,152 @@ def reduce_stats(image, aoi):
 # -----------------------
 # Database save
 # -----------------------
-def save_stats(config, stats, timestamp):
-    conn = mysql.connector.connect(**config)
-    c = conn.cursor()
-    sql = """
-        INSERT INTO crop_stats (
-            timestamp,
-            NDVI_mean, NDVI_median, NDVI_std,
-            NDWI_mean, NDWI_median, NDWI_std,
-            NDSI_mean, NDSI_median, NDSI_std,
-            SWIR_mean, SWIR_median, SWIR_std,
-            FalseColor_mean, FalseColor_median, FalseColor_std,
-            TCI_mean, TCI_median, TCI_std
-        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON DUPLICATE KEY UPDATE
-            NDVI_mean=VALUES(NDVI_mean), NDVI_median=VALUES(NDVI_median), NDVI_std=VALUES(NDVI_std),
-            NDWI_mean=VALUES(NDWI_mean), NDWI_median=VALUES(NDWI_median), NDWI_std=VALUES(NDWI_std),
-            NDSI_mean=VALUES(NDSI_mean), NDSI_median=VALUES(NDSI_median), NDSI_std=VALUES(NDSI_std),
-            SWIR_mean=VALUES(SWIR_mean), SWIR_median=VALUES(SWIR_median), SWIR_std=VALUES(SWIR_std),
-            FalseColor_mean=VALUES(FalseColor_mean), FalseColor_median=VALUES(FalseColor_median), FalseColor_std=VALUES(FalseColor_std),
-            TCI_mean=VALUES(TCI_mean), TCI_median=VALUES(TCI_median), TCI_std=VALUES(TCI_std)
-    """
-    c.execute(sql, (
-        timestamp,
-        stats.get("NDVI_mean"), stats.get("NDVI_median"), stats.get("NDVI_stdDev"),
-        stats.get("NDWI_mean"), stats.get("NDWI_median"), stats.get("NDWI_stdDev"),
-        stats.get("NDSI_mean"), stats.get("NDSI_median"), stats.get("NDSI_stdDev"),
-        stats.get("SWIR_mean"), stats.get("SWIR_median"), stats.get("SWIR_stdDev"),
-        stats.get("FalseColor_mean"), stats.get("FalseColor_median"), stats.get("FalseColor_stdDev"),
-        stats.get("TCI_mean"), stats.get("TCI_median"), stats.get("TCI_stdDev")
-    ))
-    conn.commit()
-    conn.close()
+def save_stats(db, stats, timestamp, farm_id=DEFAULT_FARM_ID):
+    upsert_crop_stats(db, [(farm_id, timestamp, stats)])
     print(f"✅ Stats saved for {timestamp}")
 
+def save_stats_many(db, rows):
+    count = upsert_crop_stats(db, rows)
+    print(f"✅ Stats saved for {count} farm-images")
+
 # -----------------------
-# Backfill workflow
+# Server-side batched reduction
 # -----------------------
-def backfill_data(start_date, end_date, aoi, max_cloud=40, max_images=6):
+def farm_collection(farms):
+    return ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Polygon(farm["coords"]), {"farm_id": farm["farm_id"]})
+        for farm in farms
+    ])
+
+def collection_stats(collection, farms_fc):
+    """Map compute_indices + reduceRegions over the whole collection on the server.
+
+    Returns a flat FeatureCollection with one property-only Feature per
+    (image, farm), carrying the reduced stats, farm_id and acquisition date.
+    """
+    bands = ["NDVI", "NDWI", "NDSI", "SWIR", "FalseColor", "TCI"]
+    reducers = ee.Reducer.mean().combine(ee.Reducer.median(), "", True).combine(ee.Reducer.stdDev(), "", True)
+
+    def per_image(img):
+        date = img.date().format("YYYY-MM-dd")
+        fc = compute_indices(img).select(bands).reduceRegions(
+            collection=farms_fc, reducer=reducers, scale=10
+        )
+        return fc.map(lambda f: f.setGeometry(None).set("date", date))
+
+    return ee.FeatureCollection(collection.map(per_image)).flatten()
+
+def iter_feature_pages(fc, count, page_size=50, workers=4):
+    """Yield pages of `page_size` features, with at most `workers` getInfo calls in flight."""
+    def fetch_page(offset):
+        return fc.toList(page_size, offset).getInfo()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(fetch_page, range(0, count, page_size))
+
+# -----------------------
+# Incremental backfill workflow
+# -----------------------
+def stored_dates(db, start_date, end_date):
+    rows = db.fetchall(
+        "SELECT farm_id, timestamp FROM crop_stats WHERE timestamp >= %s AND timestamp < %s",
+        (start_date, end_date)
+    )
+    return {(r["farm_id"], str(r["timestamp"])) for r in rows}
+
+def backfill_data(start_date, end_date, farms=None, max_cloud=40, max_images=6, page_size=50, workers=4):
+    """Backfill only acquisition dates that are not in crop_stats yet.
+
+    Every registered farm (or the given `farms`) is reduced in the same
+    reduceRegions pass. A date is skipped once every farm inside one of its
+    scenes' footprints has a row for it; farms the scenes miss aren't waited for.
+    Each page is committed as soon as it is fetched, so crop_stats itself is
+    the checkpoint: an interrupted run resumes with the dates still missing.
+    `max_images` caps how many missing dates one run processes (None = all).
+    """
+    db = get_pool()
+    init_schema(db, AOI_COORDS)
+    farms = farms or list_farms(db)
+    farms_fc = farm_collection(farms)
+
     collection = (
         ee.ImageCollection("COPERNICUS/S2_SR")
-        .filterBounds(aoi)
+        .filterBounds(farms_fc.geometry())
         .filterDate(start_date, end_date)
         .filter(ee.Filter.lt("CLOUDY_PIXEL_PERCENTAGE", max_cloud))
-        .sort("system:time_start", False)  # most recent first
+        .map(lambda img: img.set({
+            "date": img.date().format("YYYY-MM-dd"),
+            # Only farms inside the scene's footprint can get a row for its date
+            "farm_ids": farms_fc.filterBounds(img.geometry()).aggregate_array("farm_id")
+        }))
     )
 
-    size = collection.size().getInfo()
-    if size == 0:
+    # One cheap metadata call instead of reducing every scene: [[date, [farm_id, ...]], ...]
+    scenes = collection.reduceColumns(ee.Reducer.toList(2), ["date", "farm_ids"]).get("list").getInfo()
+    if not scenes:
         print(f"⚠️ No images found between {start_date} and {end_date}")
         return
 
-    images = collection.toList(size)
-    count = min(size, max_images)
+    expected = {(farm_id, d) for d, farm_ids in scenes for farm_id in farm_ids}
+    stored = stored_dates(db, start_date, end_date)
+    scene_dates = {d for d, _ in scenes}
+    missing = sorted({d for _, d in expected - stored}, reverse=True)  # most recent first
+    done = scene_dates - set(missing)
+    if max_images is not None:
+        missing = missing[:max_images]
+    if not missing:
+        print(f"✅ crop_stats already has every scene between {start_date} and {end_date}")
+        return
+
+    todo = collection.filter(ee.Filter.inList("date", missing))
+    count = todo.size().getInfo() * len(farms)
+    print(f"Backfilling {len(missing)} new dates for {len(farms)} farms, {len(done)} dates already stored")
+
+    for page in iter_feature_pages(collection_stats(todo, farms_fc), count, page_size, workers):
+        rows = []
+        for feature in page:
+            stats = dict(feature["properties"])
+            farm_id, date = stats.pop("farm_id"), stats.pop("date")
+            if stats.get("NDVI_mean") is not None:  # image doesn't cover this farm
+                rows.append((farm_id, date, stats))
+        save_stats_many(db, rows)
+
+# -----------------------
+# Offline check: python gee2.py fake
+# -----------------------
+def fake_backfill():
+    import fake_ee
+    from db import add_farm
+
+    db = get_pool()
+    init_schema(db, AOI_COORDS)
+    add_farm(db, "north field", AOI_COORDS)
+    for day in range(1, 9):
+        fake_ee.add_scene(f"2025-03-{day:02d}")
+    fake_ee.add_scene("2025-03-09", farms=[1])  # misses farm 2: must not stay "missing"
+    count = lambda: db.fetchone("SELECT COUNT(*) AS n FROM crop_stats")["n"]
 
-    for i in range(count):
-        img = ee.Image(images.get(i))
-        date_str = datetime.utcfromtimestamp(
-            img.date().getInfo()["value"] / 1000
-        ).strftime("%Y-%m-%d")
+    def run(label, **kwargs):
+        fake_ee.calls.clear()
+        try:
+            backfill_data("2025-03-01", "2025-04-01", page_size=3, workers=1, **kwargs)
+        except fake_ee.EEException as e:
+            print(f"interrupted: {e}")
+        print(f"{label}: {count()} rows, getInfo calls {dict(fake_ee.calls)}")
 
-        img_with_indices = compute_indices(img)
-        stats = reduce_stats(img_with_indices, aoi)
-        save_stats(DB_CONFIG, stats, date_str)
+    run("newest 3 dates", max_images=3)
+    run("next 3 dates, the first 3 skipped", max_images=3)
+    fake_ee.fail_next(1, kind="page", after=1)
+    run("rest, interrupted after one page", max_images=None)
+    run("resume", max_images=None)
+    run("nothing left", max_images=None)
 
 # -----------------------
 # Run once
 # -----------------------
 if __name__ == "__main__":
-    # backfill data from August 20 to Sept 10 (adjust if needed)
-    backfill_data("2025-01-01", "2025-09-10", AOI)
+    if sys.argv[1:2] == ["fake"]:
+        fake_backfill()
+    else:
+        # backfill data from August 20 to Sept 10 (adjust if needed)
+        backfill_data("2025-01-01", "2025-09-10")
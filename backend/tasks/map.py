@@ -1,10 +1,16 @@
+import json
 import math
+import os
 import requests
 from PIL import Image
 import io
 import mercantile
 import geopandas as gpd
 from shapely.geometry import Polygon
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from tile_cache import TileCache
 
 # ----------------------------
 # CONFIG
@@ -18,62 +24,109 @@ coords = [
     [74.873908, 30.273958]
 ]
 
-polygon = Polygon(coords)
-gdf = gpd.GeoDataFrame(index=[0], crs="EPSG:4326", geometry=[polygon])
+# Or stitch a farm from the registry instead (FARM_ID=<id>)
+if os.getenv("FARM_ID"):
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from db import get_pool
+
+    farm = get_pool().fetchone("SELECT polygon FROM farms WHERE farm_id = %s", (int(os.environ["FARM_ID"]),))
+    coords = json.loads(farm["polygon"])[0]
 
 zoom = 18   # Try 18 first (fallback will handle issues)
 output_file = "farm_image.png"
+cache_file = os.getenv("TILE_CACHE_PATH", "tile_cache.sqlite")
+cache_max_mb = int(os.getenv("TILE_CACHE_MAX_MB", 512))
+fetch_workers = int(os.getenv("TILE_FETCH_WORKERS", 8))
 
 # ----------------------------
 # TILE SOURCES
 # ----------------------------
 ESRI_URL = "https://services.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}"
 GOOGLE_URL = "https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}"  # unofficial
+TILE_URLS = [ESRI_URL, GOOGLE_URL]
+
+def make_session(workers=fetch_workers):
+    """One keep-alive session shared by all fetch threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(TILE_URLS), pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def fetch_tile(x, y, z):
-    """Fetch a tile, try ESRI first, then fallback to Google."""
-    urls = [
-        ESRI_URL.format(z=z, x=x, y=y),
-        GOOGLE_URL.format(z=z, x=x, y=y)
-    ]
-    for url in urls:
+def fetch_tile(session, x, y, z, urls=TILE_URLS):
+    """Fetch raw tile bytes, try ESRI first, then fallback to Google."""
+    for template in urls:
+        url = template.format(z=z, x=x, y=y)
         try:
-            r = requests.get(url, timeout=20)
+            r = session.get(url, timeout=20)
             r.raise_for_status()
-            return Image.open(io.BytesIO(r.content))
+            return r.content
         except Exception as e:
             print(f"Tile fetch failed at {url}, trying fallback...")
     return None
 
+def fetch_tiles(tiles, cache, session, urls=TILE_URLS, workers=fetch_workers):
+    """Download every tile missing from the cache on a thread pool."""
+    missing = [t for t in tiles if (t.z, t.x, t.y) not in cache]
+
+    def download(t):
+        data = fetch_tile(session, t.x, t.y, t.z, urls)
+        if data is not None:
+            cache.put(t.z, t.x, t.y, data)
+        return data is not None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fetched = sum(executor.map(download, missing))
+    print(f"{len(tiles) - len(missing)} tiles from cache, {fetched}/{len(missing)} downloaded")
+
 # ----------------------------
 # BOUNDING BOX TO TILES
 # ----------------------------
-minx, miny, maxx, maxy = gdf.total_bounds
-tiles = list(mercantile.tiles(minx, miny, maxx, maxy, zoom))
+def farm_tiles(coords, zoom):
+    polygon = Polygon(coords)
+    gdf = gpd.GeoDataFrame(index=[0], crs="EPSG:4326", geometry=[polygon])
+    minx, miny, maxx, maxy = gdf.total_bounds
+    tiles = list(mercantile.tiles(minx, miny, maxx, maxy, zoom))
 
-if not tiles:
-    raise RuntimeError("No tiles found for this area. Try lowering zoom level.")
+    if not tiles:
+        raise RuntimeError("No tiles found for this area. Try lowering zoom level.")
+    return tiles
 
 # ----------------------------
-# STITCH TILES
+# STITCH TILES (from cache)
 # ----------------------------
-tile_size = 256
-min_tx = min(t.x for t in tiles)
-max_tx = max(t.x for t in tiles)
-min_ty = min(t.y for t in tiles)
-max_ty = max(t.y for t in tiles)
-
-width = (max_tx - min_tx + 1) * tile_size
-height = (max_ty - min_ty + 1) * tile_size
-stitched = Image.new("RGB", (width, height))
-
-for t in tiles:
-    img = fetch_tile(t.x, t.y, t.z)
-    if img is None:
-        continue
-    x_offset = (t.x - min_tx) * tile_size
-    y_offset = (t.y - min_ty) * tile_size
-    stitched.paste(img, (x_offset, y_offset))
-
-stitched.save(output_file)
-print(f"✅ Stitched farm image saved as {output_file}")
+def stitch(tiles, cache, tile_size=256):
+    min_tx = min(t.x for t in tiles)
+    max_tx = max(t.x for t in tiles)
+    min_ty = min(t.y for t in tiles)
+    max_ty = max(t.y for t in tiles)
+
+    width = (max_tx - min_tx + 1) * tile_size
+    height = (max_ty - min_ty + 1) * tile_size
+    stitched = Image.new("RGB", (width, height))
+
+    for t in tiles:
+        data = cache.get(t.z, t.x, t.y)
+        if data is None:
+            continue
+        img = Image.open(io.BytesIO(data))
+        x_offset = (t.x - min_tx) * tile_size
+        y_offset = (t.y - min_ty) * tile_size
+        stitched.paste(img, (x_offset, y_offset))
+    return stitched
+
+def main(urls=TILE_URLS):
+    tiles = farm_tiles(coords, zoom)
+    cache = TileCache(cache_file, max_bytes=cache_max_mb * 1024 * 1024)
+    with make_session() as session:
+        fetch_tiles(tiles, cache, session, urls)
+
+    stitched = stitch(tiles, cache)
+    stitched.save(output_file)
+    cache.close()
+    print(f"✅ Stitched farm image saved as {output_file}")
+
+if __name__ == "__main__":
+    # Point TILE_URL at a local tile server (e.g. http://127.0.0.1:8000/{z}/{x}/{y}.png) for offline tests
+    main([os.environ["TILE_URL"]] if os.getenv("TILE_URL") else TILE_URLS)
@@ -0,0 +1,197 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# -----------------------
+# Local spectral index engine
+#
+# Same index definitions as compute_indices in gee.py/gee2.py and the same
+# output keys as reduce_stats (NDVI_mean, NDVI_median, NDVI_stdDev, ...),
+# computed over memory-mapped band arrays or GeoTIFFs in row chunks so a
+# full scene reduces with bounded memory on every core.
+# -----------------------
+INDEX_BANDS = ["NDVI", "NDWI", "NDSI", "SWIR", "FalseColor", "TCI"]
+SOURCE_BANDS = ["B2", "B3", "B4", "B8", "B11"]
+
+# Histogram range per index; medians are read from a 2^16-bin histogram
+HIST_BINS = 65536
+HIST_RANGES = {
+    "NDVI": (-1.0, 1.0),
+    "NDWI": (-1.0, 1.0),
+    "NDSI": (-1.0, 1.0),
+    "FalseColor": (-1.0, 1.0),
+    "TCI": (-0.2, 0.2),
+    "SWIR": (0.0, 65536.0)  # raw B11 digital numbers: one bin per integer, so the median is exact
+}
+
+
+def _normalized_difference(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (a - b) / (a + b)
+
+
+def compute_indices(b):
+    """Index arrays for one chunk; `b` maps band name -> float32 array."""
+    ndvi = _normalized_difference(b["B8"], b["B4"])
+    return {
+        "NDVI": ndvi,
+        "NDWI": _normalized_difference(b["B3"], b["B8"]),
+        "NDSI": _normalized_difference(b["B3"], b["B11"]),
+        "SWIR": b["B11"],
+        "FalseColor": ndvi,  # (B8 - B4) / (B8 + B4), as in the Earth Engine expression
+        "TCI": _normalized_difference(b["B3"], b["B2"]) * 0.2
+    }
+
+
+# -----------------------
+# Band sources
+# -----------------------
+class GeoTiffBand:
+    """Single-band GeoTIFF read lazily by row window (needs rasterio).
+
+    GDAL dataset handles aren't thread-safe, so every thread reading chunks
+    opens its own handle on the file.
+    """
+
+    def __init__(self, path, band=1):
+        import rasterio  # optional: only needed for GeoTIFF input
+        self._open = rasterio.open
+        self._path = path
+        self._band = band
+        self._local = threading.local()
+        with rasterio.open(path) as ds:
+            self.shape = (ds.height, ds.width)
+
+    def _dataset(self):
+        ds = getattr(self._local, "ds", None)
+        if ds is None:
+            ds = self._local.ds = self._open(self._path)
+        return ds
+
+    def __getitem__(self, rows):
+        from rasterio.windows import Window
+        start, stop, _ = rows.indices(self.shape[0])
+        return self._dataset().read(self._band, window=Window(0, start, self.shape[1], stop - start))
+
+
+def open_band(path):
+    """Open a band without reading it: .npy files are memory-mapped, .tif/.tiff read by window."""
+    if path.lower().endswith((".tif", ".tiff")):
+        return GeoTiffBand(path)
+    return np.load(path, mmap_mode="r")
+
+
+# -----------------------
+# Chunked reduction
+# -----------------------
+class _Accumulator:
+    """Mergeable count/mean/M2 (Chan et al.) plus a fixed-range histogram for the median."""
+
+    def __init__(self, lo, hi):
+        self.lo, self.hi = lo, hi
+        self.scale = HIST_BINS / (hi - lo)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.hist = np.zeros(HIST_BINS, dtype=np.int64)
+
+    def add(self, values):
+        n = values.size
+        if n == 0:
+            return
+        v = values.astype(np.float64)
+        mean = float(v.mean())
+        m2 = float(((v - mean) ** 2).sum())
+        idx = np.clip(((v - self.lo) * self.scale).astype(np.int64), 0, HIST_BINS - 1)
+        self.hist += np.bincount(idx, minlength=HIST_BINS)
+        self._combine(n, mean, m2)
+
+    def merge(self, other):
+        if other.count:
+            self.hist += other.hist
+            self._combine(other.count, other.mean, other.m2)
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def median(self):
+        k = int(np.searchsorted(np.cumsum(self.hist), (self.count + 1) / 2))
+        width = 1.0 / self.scale
+        # Integer-width bins (SWIR) hold a single value; otherwise report the bin centre
+        return self.lo + k * width + (0.0 if width == 1.0 else width / 2)
+
+    def result(self):
+        if self.count == 0:
+            return None, None, None
+        return self.mean, self.median(), (self.m2 / self.count) ** 0.5
+
+
+def _reduce_chunk(bands, mask, rows, nodata):
+    chunk = {name: np.asarray(bands[name][rows], dtype=np.float32) for name in SOURCE_BANDS}
+
+    valid = np.ones(chunk["B2"].shape, dtype=bool)
+    if nodata is not None:
+        for arr in chunk.values():
+            valid &= arr != nodata
+    if mask is not None:
+        valid &= np.asarray(mask[rows], dtype=bool)
+
+    accs = {}
+    for name, values in compute_indices(chunk).items():
+        acc = _Accumulator(*HIST_RANGES[name])
+        selected = values[valid]
+        acc.add(selected[np.isfinite(selected)])
+        accs[name] = acc
+    return accs
+
+
+def reduce_stats(bands, mask=None, chunk_rows=512, workers=None, nodata=0):
+    """Mean/median/stdDev of every index over a scene, chunk by chunk.
+
+    `bands` maps B2/B3/B4/B8/B11 to 2-D arrays on one grid (np.memmap,
+    np.load(mmap_mode="r") or GeoTiffBand); `mask` is an optional boolean
+    array of the same shape (e.g. a rasterized farm polygon). Pixels equal
+    to `nodata` in any band are ignored. Returns the same keys as Earth Engine's reduceRegion, so the
+    result can be passed straight to save_stats.
+    """
+    height = bands["B2"].shape[0]
+    chunks = [slice(start, min(start + chunk_rows, height)) for start in range(0, height, chunk_rows)]
+
+    totals = {name: _Accumulator(*HIST_RANGES[name]) for name in INDEX_BANDS}
+    # numpy releases the GIL in the heavy ufuncs, so threads spread chunks over all cores
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for accs in executor.map(lambda rows: _reduce_chunk(bands, mask, rows, nodata), chunks):
+            for name, acc in accs.items():
+                totals[name].merge(acc)
+
+    stats = {}
+    for name in INDEX_BANDS:
+        mean, median, std = totals[name].result()
+        stats[f"{name}_mean"] = mean
+        stats[f"{name}_median"] = median
+        stats[f"{name}_stdDev"] = std
+    return stats
+
+
+# -----------------------
+# Run on a downloaded scene
+# -----------------------
+if __name__ == "__main__":
+    # python raster_engine.py 2025-06-01 B2=b2.tif B3=b3.tif B4=b4.tif B8=b8.tif B11=b11.tif [farm_id=1]
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from db import get_pool, upsert_crop_stats, DEFAULT_FARM_ID
+
+    timestamp = sys.argv[1]
+    args = dict(arg.split("=", 1) for arg in sys.argv[2:])
+    farm_id = int(args.pop("farm_id", DEFAULT_FARM_ID))
+
+    stats = reduce_stats({name: open_band(args[name]) for name in SOURCE_BANDS})
+    upsert_crop_stats(get_pool(), [(farm_id, timestamp, stats)])
+    print(f"✅ Stats saved for {timestamp} (farm {farm_id})")
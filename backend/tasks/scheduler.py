@@ -0,0 +1,183 @@
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+# -----------------------
+# Change-driven ingestion scheduler
+#
+#   python scheduler.py            # run forever against Earth Engine
+#   python scheduler.py once       # a single pass over every farm
+#   python scheduler.py fake       # offline demo on fake_ee and an in-memory SQLite database
+#
+# Every farm in the registry is its own AOI job. A pass asks Earth Engine
+# only for the newest scene's system:time_start over the AOI (one metadata
+# call). If crop_stats already has that acquisition date for the farm the
+# job is done; otherwise the scene is reduced, its thumbnail pyramid saved
+# and the row written under the scene date. Jobs run concurrently; a
+# failing AOI is retried with exponential backoff and jitter while the
+# others keep their normal interval.
+#
+# INGEST_INTERVAL (s, default 3600), INGEST_WORKERS (default 4),
+# INGEST_MAX_CLOUD (%, default 20), INGEST_LOOKBACK_DAYS (default 30)
+# -----------------------
+if __name__ == "__main__" and sys.argv[1:2] == ["fake"]:
+    # Must be installed before gee.py imports ee
+    os.environ.setdefault("DB_BACKEND", "sqlite")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fake_ee
+    sys.modules["ee"] = fake_ee
+
+import ee
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db import get_pool, list_farms, upsert_crop_stats
+from gee import (
+    AOI_COORDS, init_db, sentinel_collection, latest_scene_time, scene_date,
+    compute_indices, reduce_stats, save_truecolor
+)
+
+
+class _Job:
+    def __init__(self, farm):
+        self.farm = farm
+        self.next_run = 0.0
+        self.failures = 0
+        self.last_outcome = None
+
+
+class IngestScheduler:
+    def __init__(self, db, interval=3600.0, workers=4, max_cloud=20, lookback_days=30,
+                 backoff_base=60.0, backoff_max=3600.0, thumbnails=True):
+        self.db = db
+        self.interval = interval
+        self.max_cloud = max_cloud
+        self.lookback_days = lookback_days
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.thumbnails = thumbnails
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._jobs = {}  # farm_id -> _Job
+        self._stop = threading.Event()
+
+    # -- one AOI
+    def last_stored(self, farm_id):
+        row = self.db.fetchone("SELECT MAX(timestamp) AS last FROM crop_stats WHERE farm_id = %s", (farm_id,))
+        return str(row["last"]) if row and row["last"] else None
+
+    def is_stored(self, farm_id, day):
+        return self.db.fetchone(
+            "SELECT 1 AS stored FROM crop_stats WHERE farm_id = %s AND timestamp = %s", (farm_id, day)
+        ) is not None
+
+    def ingest(self, farm):
+        """Ingest the newest scene over one farm if it isn't stored yet; returns what happened."""
+        farm_id = farm["farm_id"]
+        aoi = ee.Geometry.Polygon(farm["coords"])
+
+        # Only scenes on or after the last stored date can be new
+        since = self.last_stored(farm_id) or str(date.today() - timedelta(days=self.lookback_days))
+        collection = sentinel_collection(aoi, self.max_cloud, since)
+        time_start = latest_scene_time(collection)
+        if time_start is None:
+            return "no scene"
+        day = scene_date(time_start)
+        if self.is_stored(farm_id, day):
+            return f"up to date ({day})"
+
+        scene = collection.filter(ee.Filter.eq("system:time_start", time_start)).first()
+        stats = reduce_stats(compute_indices(scene), aoi)
+        if stats.get("NDVI_mean") is None:
+            return f"scene {day} has no clear pixels over the farm"
+        # Image first: the upsert bumps the generation that tells the API to look for it
+        if self.thumbnails:
+            save_truecolor(self.db, scene, aoi, day, farm_id)
+        upsert_crop_stats(self.db, [(farm_id, day, stats)])
+        return f"ingested {day}"
+
+    def _run_job(self, job):
+        try:
+            job.last_outcome = self.ingest(job.farm)
+            job.failures = 0
+            job.next_run = time.monotonic() + self.interval
+        except Exception as e:
+            job.failures += 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (job.failures - 1))
+            delay *= random.uniform(0.5, 1.0)  # jitter, so failing AOIs don't retry in lockstep
+            job.next_run = time.monotonic() + delay
+            job.last_outcome = f"failed ({e}), retry {job.failures} in {delay:.0f}s"
+        print(f"farm {job.farm['farm_id']}: {job.last_outcome}")
+        return job.last_outcome
+
+    # -- all AOIs
+    def run_once(self):
+        """Run every due AOI job concurrently; returns {farm_id: outcome}."""
+        farms = list_farms(self.db)  # picks up farms added since the last pass
+        self._jobs = {f["farm_id"]: self._jobs.get(f["farm_id"]) or _Job(f) for f in farms}
+        for farm in farms:
+            self._jobs[farm["farm_id"]].farm = farm
+
+        now = time.monotonic()
+        due = [job for job in self._jobs.values() if job.next_run <= now]
+        outcomes = self._executor.map(self._run_job, due)
+        return {job.farm["farm_id"]: outcome for job, outcome in zip(due, outcomes)}
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.run_once()
+            next_run = min((job.next_run for job in self._jobs.values()), default=time.monotonic() + self.interval)
+            self._stop.wait(max(1.0, next_run - time.monotonic()))
+
+    def stop(self):
+        self._stop.set()
+
+
+def from_env(db, **overrides):
+    options = {
+        "interval": float(os.getenv("INGEST_INTERVAL", 3600)),
+        "workers": int(os.getenv("INGEST_WORKERS", 4)),
+        "max_cloud": float(os.getenv("INGEST_MAX_CLOUD", 20)),
+        "lookback_days": int(os.getenv("INGEST_LOOKBACK_DAYS", 30)),
+    }
+    options.update(overrides)
+    return IngestScheduler(db, **options)
+
+
+def fake_demo():
+    import fake_ee
+    from db import add_farm
+
+    db = get_pool()
+    init_db(db)
+    add_farm(db, "north field", AOI_COORDS)
+    # The fake thumbnail URL can't be downloaded
+    scheduler = from_env(db, thumbnails=False, interval=0, backoff_base=0.1)
+
+    fake_ee.add_scene(str(date.today() - timedelta(days=3)))
+    print("pass 1: new scene", scheduler.run_once(), dict(fake_ee.calls))
+    fake_ee.calls.clear()
+    print("pass 2: nothing new", scheduler.run_once(), dict(fake_ee.calls))
+    fake_ee.calls.clear()
+    fake_ee.add_scene(str(date.today() - timedelta(days=1)))
+    fake_ee.fail_next(1)
+    print("pass 3: new scene, one AOI fails", scheduler.run_once(), dict(fake_ee.calls))
+    time.sleep(0.2)
+    print("pass 4: retry after backoff", scheduler.run_once())
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "forever"
+    if command == "fake":
+        fake_demo()
+    else:
+        pool = get_pool()
+        init_db(pool)
+        scheduler = from_env(pool)
+        if command == "once":
+            scheduler.run_once()
+        else:
+            scheduler.run_forever()
@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+import time
+
+
+# ----------------------------
+# Persistent z/x/y tile cache (single SQLite file, size-bounded LRU)
+# ----------------------------
+class TileCache:
+    """Stores raw tile bytes keyed by (z, x, y) in one SQLite file.
+
+    Every hit refreshes the tile's last-access time; once the stored bytes
+    exceed `max_bytes` the least recently used tiles are evicted.
+    """
+
+    def __init__(self, path="tile_cache.sqlite", max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tiles (
+                z INTEGER, x INTEGER, y INTEGER,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (z, x, y)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tiles_last_access ON tiles (last_access)")
+        self._conn.commit()
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM tiles").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, z, x, y):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM tiles WHERE z=? AND x=? AND y=?", (z, x, y)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE tiles SET last_access=? WHERE z=? AND x=? AND y=?", (time.time(), z, x, y))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM tiles WHERE z=? AND x=? AND y=?", key).fetchone() is not None
+
+    def put(self, z, x, y, data):
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM tiles WHERE z=? AND x=? AND y=?", (z, x, y)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tiles (z, x, y, data, size, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (z, x, y, sqlite3.Binary(data), len(data), time.time())
+            )
+            self._bytes += len(data) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT z, x, y, size FROM tiles ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                break
+            for z, x, y, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM tiles WHERE z=? AND x=? AND y=?", (z, x, y))
+                self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+        return {"tiles": count, "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
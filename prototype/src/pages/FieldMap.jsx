@@ -20,22 +20,20 @@ const FieldMap = () => {
   const [selectedIndex, setSelectedIndex] = useState(null);
   const [showMapPopup, setShowMapPopup] = useState(false);
 
-  // Fetch all data from multiple endpoints
+  // Fetch all data from the dashboard snapshot
   const fetchAllData = async (showRefreshing = false) => {
     try {
       if (showRefreshing) setRefreshing(true);
       setLoading(!indices); // Only show loading on initial load
       
-      // Fetch crop statistics
-      const [cropResponse, soilResponse, pestResponse] = await Promise.allSettled([
-        fetch(`${API_BASE}/latest-crop-stats`),
-        fetch(`${API_BASE}/predict/soil-health`),
-        fetch(`${API_BASE}/predict/pest-risk`)
-      ]);
+      // One snapshot with crop stats, soil health and pest risk (rebuilt server-side per ingest)
+      const response = await fetch(`${API_BASE}/dashboard`);
+      if (!response.ok) throw new Error('Failed to fetch dashboard');
+      const dashboard = await response.json();
 
       // Handle crop stats
-      if (cropResponse.status === 'fulfilled' && cropResponse.value.ok) {
-        const cropData = await cropResponse.value.json();
+      const cropData = dashboard.latest;
+      if (cropData) {
         setIndices({
           NDSI: cropData.indices.NDSI.mean,
           NDVI: cropData.indices.NDVI.mean,
@@ -48,15 +46,13 @@ const FieldMap = () => {
       }
 
       // Handle soil health
-      if (soilResponse.status === 'fulfilled' && soilResponse.value.ok) {
-        const soilData = await soilResponse.value.json();
-        setSoilHealth(soilData);
+      if (dashboard.soil_health) {
+        setSoilHealth(dashboard.soil_health);
       }
 
       // Handle pest risk
-      if (pestResponse.status === 'fulfilled' && pestResponse.value.ok) {
-        const pestData = await pestResponse.value.json();
-        setPestRisk(pestData);
+      if (dashboard.pest_risk) {
+        setPestRisk(dashboard.pest_risk);
       }
 
       setError(null);
@@ -53,25 +53,17 @@ const Overview = () => {
   const fetchOverviewData = async () => {
     setLoading(true);
     try {
-      // Fetch all data in parallel
-      const [cropStatsRes, recentStatsRes, pestRiskRes, soilHealthRes] = await Promise.all([
-        fetch(`${API_BASE}/latest-crop-stats`),
-        fetch(`${API_BASE}/recent-crop-stats`),
-        fetch(`${API_BASE}/predict/pest-risk`),
-        fetch(`${API_BASE}/predict/soil-health?limit=1`)
-      ]);
-
-      const cropStats = await cropStatsRes.json();
-      const recentStats = await recentStatsRes.json();
-      const pestRisk = await pestRiskRes.json();
-      const soilHealth = await soilHealthRes.json();
+      // One snapshot with latest stats, trend, pest risk and soil health (rebuilt server-side per ingest)
+      const dashboardRes = await fetch(`${API_BASE}/dashboard`);
+      if (!dashboardRes.ok) throw new Error("Failed to fetch dashboard");
+      const dashboard = await dashboardRes.json();
 
       setOverviewData({
-        cropHealth: cropStats,
-        pestRisk: pestRisk,
-        soilAnalysis: Array.isArray(soilHealth) ? soilHealth[0] : soilHealth,
-        cropStats: cropStats,
-        recentStats: recentStats
+        cropHealth: dashboard.latest,
+        pestRisk: dashboard.pest_risk,
+        soilAnalysis: dashboard.soil_health,
+        cropStats: dashboard.latest,
+        recentStats: dashboard.recent
       });
       setLastUpdated(new Date());
       setError(null);